@@ -0,0 +1,47 @@
+#defines an accumulator of the mean and variance of a series of observations in constant memory, using Welford's algorithm
+class WelfordAccumulator():
+    __slots__ = ("count", "mean", "M2")
+    #creates an empty accumulator
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+    #adds an observation
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.M2 += delta * (x - self.mean)
+    #returns the mean of the observations, or nan if there are none
+    def getMean(self):
+        if self.count == 0:
+            return float("nan")
+        return self.mean
+    #returns the sample variance of the observations, or nan if there are fewer than 2
+    def getVariance(self):
+        if self.count < 2:
+            return float("nan")
+        return self.M2 / (self.count - 1)
+
+#defines an accumulator of the exact time integral of a piecewise constant value, such as the number of components in the system
+class TimeWeightedAccumulator():
+    __slots__ = ("value", "startTime", "timeOfLastChange", "area")
+    #creates the accumulator with the given initial value at the given start time
+    def __init__(self, value = 0, startTime = 0):
+        self.value = value
+        self.startTime = startTime
+        self.timeOfLastChange = startTime
+        self.area = 0
+    #changes the value by the given amount at the given time
+    def change(self, time, amount):
+        self.area += self.value * (time - self.timeOfLastChange)
+        self.value += amount
+        self.timeOfLastChange = time
+    #returns the integral of the value from the start time to the given time
+    def getArea(self, time):
+        return self.area + self.value * (time - self.timeOfLastChange)
+    #returns the time-weighted average of the value from the start time to the given time
+    def getMean(self, time):
+        if time <= self.startTime:
+            return float("nan")
+        return self.getArea(time) / (time - self.startTime)
@@ -0,0 +1,146 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from sim import Config, Simulation, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from instruments import Instruments
+
+#the run lengths and replication counts benchmarked by default
+DEFAULT_STOP_TIMES = [10000, 100000, 1000000]
+DEFAULT_REPLICATIONS = [1, 4, 16]
+DEFAULT_REPLICATION_TIME = 100000
+
+#the fraction by which a result may be worse than the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+#returns the peak resident set size of this process in megabytes (ru_maxrss is in kilobytes on Linux)
+def peakRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+#runs a simulation of the given length and returns its wall time, events per second and peak memory
+#the run is repeated and the fastest wall time is kept, since slower runs are slowed down by the rest of the machine
+def benchmarkRun(topology_file, stop_time, seed, repeat = 1):
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file))
+    sim = Simulation(config, seed)
+    wall_time = float("inf")
+    for k in range(repeat):
+        start = time.perf_counter()
+        sim.run(stop_time)
+        wall_time = min(wall_time, time.perf_counter() - start)
+    return {"stopTime": stop_time,
+            "events": sim.eventsExecuted,
+            "wallTime": wall_time,
+            "eventsPerSecond": sim.eventsExecuted / wall_time,
+            "peakRSS": peakRSS()}
+
+#the config used by the replications run in this process, set once when a worker starts
+worker_config = None
+
+#stores the config in the worker process so it is not loaded or sent again with every replication
+def initWorker(config):
+    global worker_config
+    worker_config = config
+
+#does nothing; mapped over the pool before a benchmark starts its timer, so every worker has started and been initialized
+def warmUp(k):
+    return k
+
+#runs one replication and returns the number of events it executed, and the peak memory of the worker process so far
+def countEvents(args):
+    (seed, replication, stop_time) = args
+    sim = Simulation(worker_config, seed, replication)
+    sim.run(stop_time)
+    return (sim.eventsExecuted, peakRSS())
+
+#runs n replications of the given length on a pool of all cores and returns the wall time and events per second
+#the config is loaded once and the pool is started before the timer, so the wall time only covers running the replications,
+#as it does for the single runs
+#the peak memory is that of the largest worker process of the pool, which is started for this benchmark only
+def benchmarkReplications(topology_file, n, stop_time, seed):
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file))
+    workers = multiprocessing.cpu_count()
+    with multiprocessing.Pool(workers, initializer = initWorker, initargs = (config,)) as pool:
+        pool.map(warmUp, range(workers), chunksize = 1)
+        start = time.perf_counter()
+        counts = pool.map(countEvents, [(seed, replication, stop_time) for replication in range(n)])
+        wall_time = time.perf_counter() - start
+    events = sum(c[0] for c in counts)
+    return {"replications": n,
+            "stopTime": stop_time,
+            "events": events,
+            "wallTime": wall_time,
+            "eventsPerSecond": events / wall_time,
+            "replicationsPerSecond": n / wall_time,
+            "peakRSS": max(c[1] for c in counts)}
+
+#runs one simulation with instruments, and returns the count and time of each event type
+#the timing adds overhead to every event, so the totals are only meaningful relative to each other
+def profileEventTypes(topology_file, stop_time, seed):
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file))
+    instruments = Instruments()
+    Simulation(config, seed).run(stop_time, instruments = instruments)
+    return instruments.toDict(stop_time)["events"]
+
+#runs the function in a new process, so its peak memory is not affected by earlier benchmarks
+def runInFreshProcess(function, *args):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+#returns a description of every benchmark that is slower than the same benchmark in the baseline by more than the tolerance
+def findRegressions(results, baseline, tolerance = DEFAULT_TOLERANCE):
+    regressions = []
+    for section in ["runs", "replications"]:
+        old = dict(((r["stopTime"], r.get("replications")), r) for r in baseline.get(section, []))
+        for r in results[section]:
+            key = (r["stopTime"], r.get("replications"))
+            if key in old and r["eventsPerSecond"] < (1 - tolerance) * old[key]["eventsPerSecond"]:
+                regressions.append(section + " " + str(key) + ": " + str(round(r["eventsPerSecond"])) + " events/s, baseline " + str(round(old[key]["eventsPerSecond"])) + " events/s")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the simulation engine")
+    parser.add_argument("--stop-times", type = int, nargs = "+", default = DEFAULT_STOP_TIMES, help = "run lengths of the single-run benchmarks")
+    parser.add_argument("--replications", type = int, nargs = "+", default = DEFAULT_REPLICATIONS, help = "replication counts of the parallel benchmarks")
+    parser.add_argument("--replication-time", type = int, default = DEFAULT_REPLICATION_TIME, help = "run length of each replication")
+    parser.add_argument("--profile-time", type = int, default = DEFAULT_REPLICATION_TIME, help = "run length of the per-event-type profile")
+    parser.add_argument("-r", "--repeat", type = int, default = 3, help = "number of times each single run is repeated, keeping the fastest")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the random number streams")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("-o", "--output", default = None, help = "json file to store the results in")
+    parser.add_argument("--baseline", default = None, help = "json file of earlier results to compare against")
+    parser.add_argument("--tolerance", type = float, default = DEFAULT_TOLERANCE, help = "allowed slowdown relative to the baseline")
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(),
+               "platform": platform.platform(),
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "runs": [],
+               "replications": []}
+    for stop_time in args.stop_times:
+        r = runInFreshProcess(benchmarkRun, args.topology, stop_time, args.seed, args.repeat)
+        results["runs"].append(r)
+        print("RUN %10d min | %9d events | %8.3f s | %9.0f events/s | %7.1f MB" % (stop_time, r["events"], r["wallTime"], r["eventsPerSecond"], r["peakRSS"]))
+    for n in args.replications:
+        r = benchmarkReplications(args.topology, n, args.replication_time, args.seed)
+        results["replications"].append(r)
+        print("REPLICATIONS %4d x %d min | %8.3f s | %9.0f events/s | %7.1f MB" % (n, args.replication_time, r["wallTime"], r["eventsPerSecond"], r["peakRSS"]))
+    results["eventTypes"] = runInFreshProcess(profileEventTypes, args.topology, args.profile_time, args.seed)
+    for name in results["eventTypes"]:
+        p = results["eventTypes"][name]
+        print("%-22s %9d events | %8.3f s | %6.2f us/event" % (name, p["count"], p["time"], 1e6 * p["timePerEvent"]))
+
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent = 4)
+    if args.baseline != None:
+        with open(args.baseline) as f:
+            regressions = findRegressions(results, json.load(f), args.tolerance)
+        for r in regressions:
+            print("REGRESSION", r)
+        if len(regressions) > 0:
+            sys.exit(1)
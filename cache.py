@@ -0,0 +1,127 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+
+from sim import ENGINE_VERSION
+from inputs import INPUT_EXPONENTIAL
+
+#define the default file of the result cache
+DEFAULT_CACHE = "output/result_cache.sqlite"
+
+#returns the sha256 hash of the recorded times of every stream of a config, in the order the simulation draws from them
+def timesHash(config):
+    h = hashlib.sha256()
+    for name in sorted(config.times):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(config.times[name], dtype = np.float64).tobytes())
+    return h.hexdigest()
+
+#returns the key of the results of one replication
+#the key is a hash of everything that determines the results: the topology, the input mode and model parameters,
+#the recorded times in the empirical and trace input modes, the random number seed and replication and whether it is
+#antithetic, the run length, and the engine version
+def resultKey(config, seed, replication, stop_time, antithetic = False):
+    description = {"topology": config.topology.toDict(),
+                   "lambdas": dict((name, repr(float(config.lambdas[name]))) for name in config.lambdas),
+                   "measureInterval": config.measureInterval,
+                   "inputMode": config.inputMode,
+                   "seed": seed,
+                   "replication": replication,
+                   "antithetic": antithetic,
+                   "stopTime": stop_time,
+                   "engine": ENGINE_VERSION}
+    if config.inputMode != INPUT_EXPONENTIAL:
+        description["times"] = timesHash(config)
+    return hashlib.sha256(json.dumps(description, sort_keys = True).encode()).hexdigest()
+
+#defines an on-disk cache of replication results, stored in a SQLite database
+class ResultCache():
+    #opens the cache, creating the database if it does not exist
+    def __init__(self, filename = DEFAULT_CACHE):
+        folder = os.path.dirname(filename)
+        if folder != "":
+            os.makedirs(folder, exist_ok = True)
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, metrics TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+    #returns the metrics stored under the key, or None if there are none
+    def get(self, key):
+        row = self.connection.execute("SELECT metrics FROM results WHERE key = ?", (key,)).fetchone()
+        if row == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+    #stores the metrics under the key
+    def put(self, key, metrics):
+        text = json.dumps(metrics)
+        now = time.time()
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, text, len(text), now, now))
+    #writes the changes to disk
+    def commit(self):
+        self.connection.commit()
+    #returns the number of stored results and their total size in bytes
+    def getSize(self):
+        (count, size) = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return (count, size)
+    #deletes results that have not been used for longer than max_age seconds, then the least recently used results
+    #until the total size is at most max_size bytes, and returns the number of results deleted
+    def evict(self, max_size = None, max_age = None):
+        deleted = 0
+        if max_age != None:
+            deleted += self.connection.execute("DELETE FROM results WHERE accessed < ?", (time.time() - max_age,)).rowcount
+        if max_size != None:
+            (count, size) = self.getSize()
+            rows = self.connection.execute("SELECT key, size FROM results ORDER BY accessed").fetchall()
+            for (key, row_size) in rows:
+                if size <= max_size:
+                    break
+                self.connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                size -= row_size
+                deleted += 1
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+        return deleted
+    #commits and closes the database
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+#returns the metrics of every job, taking the ones in the cache from it and running the others with the given function
+#each job is a (key, argument) pair; run_missing receives the list of arguments of the jobs not in the cache and returns their metrics
+def cachedRun(cache, jobs, run_missing):
+    if cache == None:
+        return run_missing([argument for (key, argument) in jobs])
+    metrics = [cache.get(key) for (key, argument) in jobs]
+    missing = [k for k in range(len(jobs)) if metrics[k] == None]
+    if len(missing) > 0:
+        new_metrics = run_missing([jobs[k][1] for k in missing])
+        for (k, m) in zip(missing, new_metrics):
+            cache.put(jobs[k][0], m)
+            metrics[k] = m
+    cache.commit()
+    return metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Show the size of the result cache and evict old results")
+    parser.add_argument("cache", nargs = "?", default = DEFAULT_CACHE, help = "cache database file")
+    parser.add_argument("--max-size", type = float, default = None, help = "largest total size of the stored results in megabytes")
+    parser.add_argument("--max-age", type = float, default = None, help = "delete results not used for this many days")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache)
+    if args.max_size != None or args.max_age != None:
+        deleted = cache.evict(None if args.max_size == None else args.max_size * 1024 * 1024,
+                              None if args.max_age == None else args.max_age * 24 * 60 * 60)
+        print("EVICTED", deleted, "RESULTS")
+    (count, size) = cache.getSize()
+    print("CACHE HOLDS", count, "RESULTS,", round(size / 1024 / 1024, 3), "MB")
+    cache.close()
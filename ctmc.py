@@ -0,0 +1,316 @@
+import argparse
+import time
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparse_linalg
+
+from sim import Config, Simulation, SimulationResults, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from routing import ROUND_ROBIN, SHORTEST_QUEUE, PRIORITY, IDLE_FIRST
+from inputs import INPUT_EXPONENTIAL
+
+#the relative residual the iterative solver of the stationary distribution stops at
+SOLVER_TOLERANCE = 1e-13
+
+#defines the plant as a continuous-time Markov chain
+#with exponential inspection and assembly times, the plant is fully described at any time by:
+#  the component each inspector is inspecting, or is holding while blocked, and whether it is blocked
+#  the level of every buffer
+#  whether each workstation is assembling
+#  the position of the next buffer to try of every round-robin inspector and component
+#a state is a tuple of these, in this order, and the chain moves between states when an inspection or an assembly finishes
+#everything that happens at the same time as the finish (buffer fills, assembly starts, unblocking) is resolved immediately,
+#in the same order as the events of the simulation
+class PlantChain():
+    #creates the chain of the topology of the config, whose inspection and assembly times must be exponential
+    def __init__(self, config):
+        if config.inputMode != INPUT_EXPONENTIAL:
+            raise ValueError("the Markov chain needs exponential inspection and assembly times")
+        topology = config.topology
+        self.topology = topology
+        self.inspectors = topology.inspectors
+        self.workstations = topology.workstations
+        self.buffers = topology.buffers
+        for i in self.inspectors:
+            if i["routing"] not in [ROUND_ROBIN, SHORTEST_QUEUE, PRIORITY, IDLE_FIRST]:
+                raise ValueError("the Markov chain does not support the routing rule " + str(i["routing"]))
+        inspector_index = dict((self.inspectors[k]["id"], k) for k in range(len(self.inspectors)))
+        workstation_index = dict((self.workstations[k]["id"], k) for k in range(len(self.workstations)))
+        #the inspector, workstation and component index of each buffer, in the order of the topology
+        self.bufferInspector = [inspector_index[b["inspector"]] for b in self.buffers]
+        self.bufferWorkstation = [workstation_index[b["workstation"]] for b in self.buffers]
+        self.bufferComponent = [self.inspectors[self.bufferInspector[k]]["components"].index(self.buffers[k]["component"]) for k in range(len(self.buffers))]
+        self.capacity = [b["capacity"] for b in self.buffers]
+        #the buffers of each workstation in the order of the topology, and of each inspector per component index in routing order
+        self.workstationBuffers = [[k for k in range(len(self.buffers)) if self.bufferWorkstation[k] == w] for w in range(len(self.workstations))]
+        self.inspectorBuffers = [topology.routingOrder(i) for i in self.inspectors]
+        #the rate of every inspection and assembly
+        self.inspectionRates = [[config.lambdas[Topology.inspectionStreamName(i["id"], c)] for c in i["components"]] for i in self.inspectors]
+        self.assemblyRates = [config.lambdas[Topology.assemblyStreamName(w["id"])] for w in self.workstations]
+        #the round-robin pointers are kept for every (inspector, component index) pair with round-robin routing
+        self.pointers = [(i, c) for i in range(len(self.inspectors)) if self.inspectors[i]["routing"] == ROUND_ROBIN
+                         for c in range(len(self.inspectors[i]["components"]))]
+        self.pointerIndex = dict((self.pointers[k], k) for k in range(len(self.pointers)))
+        self.states = []
+        self.index = {}
+        self.generator = None
+
+    #returns the states reached, with their probabilities, when each inspector chooses its first component at time 0
+    def initialStates(self):
+        n = len(self.inspectors)
+        state = ([0] * n, [False] * n, [0] * len(self.buffers), [False] * len(self.workstations), [0] * len(self.pointers))
+        outcomes = [(state, 1.0)]
+        for i in range(n):
+            outcomes = [o for (s, p) in outcomes for o in self.chooseComponent(s, p, i)]
+        return [(self.freeze(s), p) for (s, p) in outcomes]
+
+    #returns an immutable copy of a state, so it can be used as a dictionary key
+    @staticmethod
+    def freeze(state):
+        return tuple(tuple(part) for part in state)
+
+    #returns a mutable copy of a state
+    @staticmethod
+    def thaw(state):
+        return tuple(list(part) for part in state)
+
+    #returns the outcomes of the inspector choosing its next component, each with its probability
+    def chooseComponent(self, state, probability, i):
+        weights = self.inspectors[i]["weights"]
+        if len(weights) == 1:
+            return [(state, probability)]
+        outcomes = []
+        for c in range(len(weights)):
+            if weights[c] > 0:
+                s = self.thaw(state)
+                s[0][i] = c
+                outcomes.append((s, probability * weights[c]))
+        return outcomes
+
+    #returns the buffer the inspector puts its component in, or None if all of them are full, and moves the round-robin pointer
+    #this is Inspector.chooseBuffer on the state of the chain
+    def chooseBuffer(self, state, i, c):
+        (components, blocked, levels, busy, pointers) = state
+        buffers = self.inspectorBuffers[i][c]
+        free = [b for b in buffers if levels[b] < self.capacity[b]]
+        if len(free) == 0:
+            return None
+        routing = self.inspectors[i]["routing"]
+        if routing == ROUND_ROBIN:
+            n = len(buffers)
+            p = self.pointerIndex[(i, c)]
+            start = pointers[p]
+            for k in range(n):
+                b = buffers[(start + k) % n]
+                if levels[b] < self.capacity[b]:
+                    pointers[p] = (start + k + 1) % n
+                    return b
+        if routing == PRIORITY:
+            return free[0]
+        if routing == IDLE_FIRST:
+            idle = [b for b in free if not busy[self.bufferWorkstation[b]]]
+            if len(idle) > 0:
+                return idle[0]
+        #the first buffer holding the fewest components, which is also the choice of idle-first when no workstation is idle
+        chosen = free[0]
+        for b in free:
+            if levels[b] < levels[chosen]:
+                chosen = b
+        return chosen
+
+    #resolves the immediate events in the queue, in order, and returns the states they lead to with their probabilities
+    #the queue holds ("fill", buffer) and ("assemble", workstation) entries, the BufferFillEvents and BeginAssemblyEvents of the simulation
+    def resolve(self, state, probability, queue):
+        while len(queue) > 0:
+            (kind, k) = queue.pop(0)
+            (components, blocked, levels, busy, pointers) = state
+            if kind == "fill":
+                levels[k] += 1
+                w = self.bufferWorkstation[k]
+                if not busy[w] and all(levels[b] > 0 for b in self.workstationBuffers[w]):
+                    queue.append(("assemble", w))
+                #the inspector chooses its next component, which may branch into several states
+                outcomes = self.chooseComponent(state, probability, self.bufferInspector[k])
+                if len(outcomes) > 1:
+                    return [o for (s, p) in outcomes for o in self.resolve(s, p, list(queue))]
+                (state, probability) = outcomes[0]
+            else:
+                for b in self.workstationBuffers[k]:
+                    levels[b] -= 1
+                    i = self.bufferInspector[b]
+                    if blocked[i] and components[i] == self.bufferComponent[b]:
+                        blocked[i] = False
+                        queue.append(("fill", b))
+                busy[k] = True
+        return [(state, probability)]
+
+    #returns the states the chain can move to from the given state, each with its rate
+    def transitions(self, state):
+        (components, blocked, levels, busy, pointers) = state
+        moves = []
+        #an inspector finishes inspecting its component
+        for i in range(len(self.inspectors)):
+            if blocked[i]:
+                continue
+            s = self.thaw(state)
+            b = self.chooseBuffer(s, i, components[i])
+            if b == None:
+                s[1][i] = True
+                outcomes = [(s, 1.0)]
+            else:
+                outcomes = self.resolve(s, 1.0, [("fill", b)])
+            rate = self.inspectionRates[i][components[i]]
+            moves.extend((self.freeze(o), rate * p) for (o, p) in outcomes)
+        #a workstation finishes assembling a product
+        for w in range(len(self.workstations)):
+            if not busy[w]:
+                continue
+            s = self.thaw(state)
+            if all(s[2][b] > 0 for b in self.workstationBuffers[w]):
+                outcomes = self.resolve(s, 1.0, [("assemble", w)])
+            else:
+                s[3][w] = False
+                outcomes = [(s, 1.0)]
+            rate = self.assemblyRates[w]
+            moves.extend((self.freeze(o), rate * p) for (o, p) in outcomes)
+        return moves
+
+    #builds every state reachable from the initial states, and the sparse generator matrix of the chain
+    def build(self):
+        self.states = []
+        self.index = {}
+        pending = []
+        for (s, p) in self.initialStates():
+            if s not in self.index:
+                self.index[s] = len(self.states)
+                self.states.append(s)
+                pending.append(s)
+        rows = []
+        columns = []
+        rates = []
+        while len(pending) > 0:
+            s = pending.pop()
+            row = self.index[s]
+            for (t, rate) in self.transitions(s):
+                if t == s:
+                    continue
+                if t not in self.index:
+                    self.index[t] = len(self.states)
+                    self.states.append(t)
+                    pending.append(t)
+                rows.append(row)
+                columns.append(self.index[t])
+                rates.append(rate)
+        n = len(self.states)
+        Q = sparse.coo_matrix((rates, (rows, columns)), shape = (n, n)).tocsr()
+        Q = Q - sparse.diags(np.asarray(Q.sum(axis = 1)).ravel())
+        self.generator = Q.tocsr()
+        return self.generator
+
+    #returns the stationary distribution of the chain, the solution of pi Q = 0 whose entries sum to 1
+    #fixing the probability of the first state to 1 removes its redundant balance equation, which leaves a sparse nonsingular
+    #system for the other states; it is solved iteratively, which is much faster than a direct solve on chains of this shape
+    #if the iteration fails, e.g. because the first state is transient, a direct solve with the normalization in place of one
+    #balance equation is used instead
+    def solve(self):
+        if self.generator == None:
+            self.build()
+        n = len(self.states)
+        QT = self.generator.transpose().tocsc()
+        (x, info) = sparse_linalg.bicgstab(QT[1:, 1:], -QT[1:, 0].toarray().ravel(), rtol = SOLVER_TOLERANCE, atol = 0, maxiter = 100 * n)
+        pi = np.concatenate(([1.0], x))
+        pi = pi / np.sum(pi)
+        if info != 0 or np.min(pi) < -SOLVER_TOLERANCE or np.max(np.abs(QT @ pi)) > 1e-9 * np.max(np.abs(self.generator.diagonal())):
+            A = QT.tolil()
+            A[0, :] = np.ones(n)
+            b = np.zeros(n)
+            b[0] = 1
+            pi = sparse_linalg.spsolve(A.tocsc(), b)
+        pi = np.maximum(pi, 0)
+        return pi / np.sum(pi)
+
+#holds the steady-state metrics of the plant computed from its Markov chain
+#the metrics have the same names and units as those of a simulation, with the products completed being the expected number
+#over the given number of minutes
+class ChainResults(SimulationResults):
+    #creates the results from a chain and its stationary distribution
+    def __init__(self, chain, pi, stop_time):
+        self.stopTime = stop_time
+        self.observedTime = stop_time
+        self.states = len(chain.states)
+        states = chain.states
+        components = np.array([s[0] for s in states]).reshape(len(states), -1)
+        blocked = np.array([s[1] for s in states], dtype = float).reshape(len(states), -1)
+        levels = np.array([s[2] for s in states], dtype = float).reshape(len(states), -1)
+        busy = np.array([s[3] for s in states], dtype = float).reshape(len(states), -1)
+        #throughput of each workstation: it completes products at its assembly rate whenever it is busy
+        busy_probability = pi @ busy
+        rates = [chain.assemblyRates[w] * busy_probability[w] for w in range(len(chain.workstations))]
+        self.productsCompleted = {}
+        self.workstationBusy = {}
+        for w in range(len(chain.workstations)):
+            self.productsCompleted[chain.workstations[w]["id"]] = rates[w] * stop_time
+            self.workstationBusy[chain.workstations[w]["id"]] = 100 * busy_probability[w]
+        self.throughput = sum(rates)
+        blocked_probability = pi @ blocked
+        self.inspectorIdle = {}
+        for i in range(len(chain.inspectors)):
+            self.inspectorIdle[chain.inspectors[i]["id"]] = 100 * blocked_probability[i]
+        mean_levels = pi @ levels
+        self.bufferOccupancy = {}
+        for k in range(len(chain.buffers)):
+            self.bufferOccupancy[(chain.buffers[k]["inspector"], chain.buffers[k]["workstation"])] = mean_levels[k]
+        #a component enters the system when it is put in a buffer, or when it is chosen by an inspector of several components,
+        #and leaves when the product it is assembled into is finished, so in steady state both rates are the rate it is consumed
+        #the number in system counts the components in buffers, in assembly, and held by inspectors of several components,
+        #and the time in system follows from Little's law
+        self.arrivalRate = {}
+        self.departureRate = {}
+        self.averageTimeInSystem = {}
+        self.averageNumberInSystem = {}
+        self.timeInSystemVariance = {}
+        self.sampledNumberInSystem = {}
+        for c in chain.topology.components:
+            rate = 0
+            number = 0
+            for k in range(len(chain.buffers)):
+                if chain.buffers[k]["component"] == c:
+                    rate += rates[chain.bufferWorkstation[k]]
+                    number += mean_levels[k] + busy_probability[chain.bufferWorkstation[k]]
+            for i in range(len(chain.inspectors)):
+                inspected = chain.inspectors[i]["components"]
+                if len(inspected) > 1 and c in inspected:
+                    number += np.sum(pi[components[:, i] == inspected.index(c)])
+            self.arrivalRate[c] = rate
+            self.departureRate[c] = rate
+            self.averageNumberInSystem[c] = number
+            self.averageTimeInSystem[c] = number / rate if rate > 0 else float("nan")
+            self.timeInSystemVariance[c] = float("nan")
+            self.sampledNumberInSystem[c] = number
+
+#returns the steady-state results of the plant of the config, computed from its Markov chain
+def solveSteadyState(config, stop_time = 1):
+    chain = PlantChain(config)
+    chain.build()
+    return ChainResults(chain, chain.solve(), stop_time)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compute the steady-state metrics of the plant exactly from its continuous-time Markov chain")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("-t", "--stop-time", type = int, default = 10000, help = "minutes the expected number of finished products is given for")
+    parser.add_argument("--compare", action = "store_true", help = "also run the simulation for the stop time and print both sets of metrics")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the random number streams of the compared simulation")
+    args = parser.parse_args()
+
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology))
+    start = time.perf_counter()
+    results = solveSteadyState(config, args.stop_time)
+    print("MARKOV CHAIN SOLVED:", results.states, "states in", round(time.perf_counter() - start, 3), "s")
+    if args.compare:
+        simulated = Simulation(config, args.seed).run(args.stop_time).metrics()
+        exact = results.metrics()
+        print("%-40s %16s %16s" % ("Metric", "Markov chain", "Simulation"))
+        for name in exact:
+            print("%-40s %16.6f %16.6f" % (name, exact[name], simulated[name]))
+    else:
+        results.report()
@@ -0,0 +1,126 @@
+import argparse
+import array
+import json
+import os
+import numpy as np
+
+#the amount of detail recorded about a run
+#off records nothing, summary records the final statistics, full also records every event in a binary trace
+TRACE_OFF = "off"
+TRACE_SUMMARY = "summary"
+TRACE_FULL = "full"
+TRACE_LEVELS = [TRACE_OFF, TRACE_SUMMARY, TRACE_FULL]
+
+#the code stored for each event type, and the abbreviation used in the text format
+BIE = 0
+FIE = 1
+BFE = 2
+BAE = 3
+FAE = 4
+ME = 5
+EVENT_NAMES = ["BIE", "FIE", "BFE", "BAE", "FAE", "ME"]
+
+#the id stored for an entity that is not part of an event
+NO_ID = -1
+
+#the columns of a trace, each stored in its own file as raw values of the given type
+#the array module type codes match the NumPy types, so each file can be memory-mapped with np.memmap
+COLUMNS = [("type", "B", "uint8"), ("time", "d", "float64"), ("inspector", "h", "int16"),
+           ("workstation", "h", "int16"), ("component", "h", "int16")]
+
+#the number of events held in memory before they are written to the column files
+FLUSH_SIZE = 65536
+
+#defines a writer of binary event traces
+#events are appended to in-memory columns and written to one file per column every FLUSH_SIZE events
+class TraceWriter():
+    #creates the writer and the folder holding the trace
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok = True)
+        self.count = 0
+        self.files = []
+        self.columns = []
+        for (name, code, dtype) in COLUMNS:
+            self.files.append(open(os.path.join(folder, name + ".bin"), "wb"))
+            self.columns.append(array.array(code))
+        (self.types, self.times, self.inspectors, self.workstations, self.components) = self.columns
+    #records an event
+    def record(self, type, time, inspector, workstation, component):
+        self.types.append(type)
+        self.times.append(time)
+        self.inspectors.append(inspector)
+        self.workstations.append(workstation)
+        self.components.append(component)
+        if len(self.types) >= FLUSH_SIZE:
+            self.flush()
+    #writes the events held in memory to the column files
+    def flush(self):
+        self.count += len(self.types)
+        for (column, f) in zip(self.columns, self.files):
+            column.tofile(f)
+            del column[:]
+    #writes the remaining events and the header describing the trace, then closes the column files
+    def close(self):
+        self.flush()
+        for f in self.files:
+            f.close()
+        header = {"count": self.count,
+                  "columns": dict((name, dtype) for (name, code, dtype) in COLUMNS),
+                  "events": EVENT_NAMES}
+        with open(os.path.join(self.folder, "header.json"), "w") as f:
+            json.dump(header, f, indent = 4)
+
+#returns the columns of a trace as memory-mapped NumPy arrays keyed by column name
+def readTrace(folder):
+    with open(os.path.join(folder, "header.json")) as f:
+        header = json.load(f)
+    columns = {}
+    for name in header["columns"]:
+        if header["count"] == 0:
+            columns[name] = np.zeros(0, dtype = header["columns"][name])
+        else:
+            columns[name] = np.memmap(os.path.join(folder, name + ".bin"), dtype = header["columns"][name], mode = "r", shape = (header["count"],))
+    return columns
+
+#returns an event time as it is printed in the text format
+#the initial events and the measurements are scheduled at whole minutes and are printed without a decimal point
+def formatTime(type, time):
+    if time == 0 or (type == ME and time.is_integer()):
+        return str(int(time))
+    return str(time)
+
+#returns the text description of one event, in the same format as the desc() method of the events
+def describe(type, time, inspector, workstation, component):
+    line = EVENT_NAMES[type] + " | t: " + formatTime(type, time)
+    if inspector != NO_ID:
+        line += " | I: " + str(inspector)
+    if workstation != NO_ID:
+        line += " | W: " + str(workstation)
+    if component != NO_ID:
+        line += " | C: " + str(component)
+    return line
+
+#writes the events of a binary trace to a text file in the original output format
+#if a summary file is given, its contents are appended after the events
+def convertTrace(folder, output_filename, summary_filename = None):
+    columns = readTrace(folder)
+    with open(output_filename, "w") as output_file:
+        #convert the trace in chunks so the whole trace never has to be held in memory as Python objects
+        for start in range(0, len(columns["type"]), FLUSH_SIZE):
+            end = start + FLUSH_SIZE
+            rows = zip(columns["type"][start:end].tolist(), columns["time"][start:end].tolist(),
+                       columns["inspector"][start:end].tolist(), columns["workstation"][start:end].tolist(),
+                       columns["component"][start:end].tolist())
+            output_file.write("".join(describe(*row) + "\n" for row in rows))
+        if summary_filename != None:
+            with open(summary_filename) as summary_file:
+                output_file.write(summary_file.read())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Convert a binary event trace to the text output format")
+    parser.add_argument("trace", help = "folder holding the binary trace")
+    parser.add_argument("output", help = "text file to write")
+    parser.add_argument("--summary", default = None, help = "summary file to append after the events")
+    args = parser.parse_args()
+    convertTrace(args.trace, args.output, args.summary)
@@ -1,116 +1,147 @@
-import numpy as np
-import matplotlib.pyplot as plt
+import argparse
+import json
 import math
+import numpy as np
 import scipy.stats as stats
 
-#define the folder where inspection time and assembly time files are located
-DATA_FOLDER = "data/"
+from topology import Topology, DEFAULT_TOPOLOGY
+from sim import lam_estimator, fileHash, DATA_FOLDER, PARAMETER_FILE
+
+#the candidate distributions fitted to every dataset, by their scipy.stats name
+#every candidate has its location fixed at 0, since inspection and assembly times start at 0
+CANDIDATES = ["expon", "gamma", "weibull_min", "lognorm"]
+
+#the plot title of each dataset, keyed by stream name
+TITLES = {"I1C1": "Inspector 1 Inspection Times (Component 1)",
+          "I2C2": "Inspector 2 Inspection Times (Component 2)",
+          "I2C3": "Inspector 2 Inspection Times (Component 3)",
+          "W1": "Workstation 1 Assembly Times (Product 1)",
+          "W2": "Workstation 2 Assembly Times (Product 2)",
+          "W3": "Workstation 3 Assembly Times (Product 3)"}
+
+#loads a data file of whitespace separated times
+#np.fromfile parses the text in C, which is much faster than np.loadtxt on large logs
+def load_times(filename):
+    return np.fromfile(filename, sep = " ")
+
+#returns the largest number of equal-width bins, starting from the square root of the sample size, for which no bin is empty
+#the data is sorted once and the counts of each candidate are found with a binary search of the bin edges,
+#so each candidate costs O(bins log n) instead of a pass over the data
+def select_bins(data):
+    data = np.sort(data)
+    bins = math.floor(math.sqrt(len(data)))
+    while bins > 1:
+        edges = np.linspace(data[0], data[-1], bins + 1)
+        positions = np.searchsorted(data, edges, side = "left")
+        positions[-1] = len(data)
+        if np.all(np.diff(positions) > 0):
+            break
+        bins -= 1
+    return bins
+
+#returns the frozen scipy.stats distribution of the given candidate fitted to the data by maximum likelihood
+def fit_distribution(name, data):
+    if name == "expon":
+        return stats.expon(scale = 1 / lam_estimator(data))
+    dist = getattr(stats, name)
+    params = dist.fit(data, floc = 0)
+    return dist(*params)
 
-#load the inspection and assembly times from the files in the DATA_FOLDER
-I1C1_times = np.loadtxt(DATA_FOLDER + 'servinsp1.dat', unpack = True)
-I2C2_times = np.loadtxt(DATA_FOLDER + 'servinsp22.dat', unpack = True)
-I2C3_times = np.loadtxt(DATA_FOLDER + 'servinsp23.dat', unpack = True)
-W1_times = np.loadtxt(DATA_FOLDER + 'ws1.dat', unpack = True)
-W2_times = np.loadtxt(DATA_FOLDER + 'ws2.dat', unpack = True)
-W3_times = np.loadtxt(DATA_FOLDER + 'ws3.dat', unpack = True)
+#returns the chi-square statistic, degrees of freedom and p-value of the fitted distribution
+#the bins are equiprobable under the fitted distribution, so every expected frequency is equal and at least 5 and no bins need merging
+def chi_square_test(data, dist, fitted_params):
+    n = len(data)
+    bins = max(2, min(math.floor(math.sqrt(n)), n // 5))
+    edges = dist.ppf(np.linspace(0, 1, bins + 1))
+    observed = np.diff(np.searchsorted(np.sort(data), edges[1:-1], side = "right"), prepend = 0, append = n)
+    expected = n / bins
+    statistic = float(np.sum((observed - expected) ** 2) / expected)
+    df = max(1, bins - 1 - fitted_params)
+    return (statistic, df, float(stats.chi2.sf(statistic, df)))
 
-def lam_estimator(data):
-    return len(data) / sum(data)
+#fits every candidate distribution to the data and returns their parameters and goodness of fit
+def fit_candidates(data):
+    fits = {}
+    for name in CANDIDATES:
+        dist = fit_distribution(name, data)
+        fitted_params = 1 if name == "expon" else 2
+        (chi2, df, chi2_p) = chi_square_test(data, dist, fitted_params)
+        ks = stats.kstest(data, dist.cdf)
+        fits[name] = {"params": [float(p) for p in dist.args] + [float(dist.kwds[k]) for k in sorted(dist.kwds)],
+                      "chi2": chi2, "df": df, "chi2P": chi2_p,
+                      "ks": float(ks.statistic), "ksP": float(ks.pvalue)}
+    return fits
+
+#fits every dataset of the topology in one batch and writes the parameters to the parameter file
+#the exponential lambda of each stream is what sim.py uses; the other fits are recorded for comparison
+def fit_all(topology, folder = DATA_FOLDER, filename = DATA_FOLDER + PARAMETER_FILE):
+    files = topology.dataFiles()
+    streams = {}
+    for name in files:
+        data = load_times(folder + files[name])
+        fits = fit_candidates(data)
+        streams[name] = {"file": files[name],
+                         "sha256": fileHash(folder + files[name]),
+                         "n": len(data),
+                         "lambda": lam_estimator(data),
+                         "bins": select_bins(data),
+                         "best": min(fits, key = lambda k: fits[k]["ks"]),
+                         "fits": fits}
+    with open(filename, "w") as f:
+        json.dump({"streams": streams}, f, indent = 4)
+    return streams
+
+#prints the goodness of fit of every candidate of every stream
+def report(streams):
+    for name in streams:
+        s = streams[name]
+        print(name, "|", s["file"], "| n:", s["n"], "| lambda:", s["lambda"], "| best:", s["best"])
+        for candidate in s["fits"]:
+            fit = s["fits"][candidate]
+            print("    %-12s chi2 %10.3f (df %3d, p %.4f) | KS %.4f (p %.4f)" % (candidate, fit["chi2"], fit["df"], fit["chi2P"], fit["ks"], fit["ksP"]))
 
 def build_qq_plot(title, data, test_dist):
+    import matplotlib.pyplot as plt
     stats.probplot(data, dist = test_dist, plot = plt)
     plt.title(title + " - " + test_dist)
     plt.show()
 
 def build_histogram(title, xlabel, ylabel, data):
-    bins=math.floor(math.sqrt(len(data)))
-    while True:
-        arr=plt.hist(data,bins)
-        zero_found = False
-        for i in range(bins):
-            if int(arr[0][i]) == 0:
-                zero_found = True
-        if not zero_found:
-            break
-        plt.cla()
-        bins-=1
+    import matplotlib.pyplot as plt
+    bins = select_bins(data)
+    arr = plt.hist(data, bins)
     for i in range(bins):
-        plt.text(int(arr[1][i]),int(arr[0][i]),str(int(arr[0][i])))
+        plt.text(int(arr[1][i]), int(arr[0][i]), str(int(arr[0][i])))
     plt.title(title)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
     plt.show()
     return (arr, lam_estimator(data))
-    
-def do_qq_plots(test_dist):
-    build_qq_plot("Inspector 1 Inspection Times (Component 1)", I1C1_times, test_dist)
-    build_qq_plot("Inspector 2 Inspection Times (Component 2)", I2C2_times, test_dist)
-    build_qq_plot("Inspector 2 Inspection Times (Component 3)", I2C3_times, test_dist)
-    build_qq_plot("Workstation 1 Assembly Times (Product 1)", W1_times, test_dist)
-    build_qq_plot("Workstation 2 Assembly Times (Product 2)", W2_times, test_dist)
-    build_qq_plot("Workstation 3 Assembly Times (Product 3)", W3_times, test_dist)
-    
-def do_histograms():
-    (hist, lam_estimator) = build_histogram("Inspector 1 Inspection Times (Component 1)", "Minutes", "Frequency", I1C1_times)
-    chi_square_test(hist, lam_estimator)
-    (hist, lam_estimator) = build_histogram("Inspector 2 Inspection Times (Component 2)", "Minutes", "Frequency", I2C2_times)
-    chi_square_test(hist, lam_estimator)
-    (hist, lam_estimator) = build_histogram("Inspector 2 Inspection Times (Component 3)", "Minutes", "Frequency", I2C3_times)
-    chi_square_test(hist, lam_estimator)
-    (hist, lam_estimator) = build_histogram("Workstation 1 Assembly Times (Product 1)", "Minutes", "Frequency", W1_times)
-    chi_square_test(hist, lam_estimator)
-    (hist, lam_estimator) = build_histogram("Workstation 2 Assembly Times (Product 2)", "Minutes", "Frequency", W2_times)
-    chi_square_test(hist, lam_estimator)
-    (hist, lam_estimator) = build_histogram("Workstation 3 Assembly Times (Product 3)", "Minutes", "Frequency", W3_times)
-    chi_square_test(hist, lam_estimator)
-    
-def chi_square_test(hist, lam):
-    bin_counts = hist[0]
-    bin_bottoms = hist[1]
-    cum_probs_of_exp_dist = []
-    n = sum(bin_counts)
-    for x in bin_bottoms:
-        cum_probs_of_exp_dist.append(1-math.e**(-1*lam*x))
-    exp_freqs = []
-    i = 0
-    while i <= len(bin_bottoms):
-        if i == 0:
-            exp_freqs.append(n*(cum_probs_of_exp_dist[i]))
-        elif i == len(bin_bottoms):
-            exp_freqs.append(n*(1 - cum_probs_of_exp_dist[i - 1]))
-        else:
-            exp_freqs.append(n*(cum_probs_of_exp_dist[i] - cum_probs_of_exp_dist[i - 1]))
-        i += 1
-    
-    bottoms = []
-    ei = []
-    oi = []
-    sums = []
-    running_exp_prob = 0
-    running_obs_prob = 0
-    for i in range(len(exp_freqs)):
-        running_exp_prob += exp_freqs[i]
-        if i == 0:
-            running_obs_prob += 0
-        elif i > len(bin_counts):
-            running_obs_prob += 0
-        else:
-            running_obs_prob += bin_counts[i - 1]
-        if running_exp_prob >= 5:
-            if sum(exp_freqs[i + 1:]) < 5:
-                ei.append(running_exp_prob + sum(exp_freqs[i + 1:]))
-                oi.append(running_obs_prob + sum(bin_counts[i:]))
-                break
-            ei.append(running_exp_prob)
-            oi.append(running_obs_prob)
-            running_exp_prob = 0
-            running_obs_prob = 0
-    
-    chi_square_sum = 0
-    for i in range(len(oi)):
-        sums.append((oi[i] - ei[i]) ** 2 / ei[i])
-        chi_square_sum += (oi[i] - ei[i]) ** 2 / ei[i]
-    
-do_qq_plots("norm")
-do_qq_plots("expon")
-do_histograms()
+
+def do_qq_plots(datasets, test_dist):
+    for name in datasets:
+        build_qq_plot(TITLES.get(name, name), datasets[name], test_dist)
+
+def do_histograms(datasets):
+    for name in datasets:
+        (hist, lam) = build_histogram(TITLES.get(name, name), "Minutes", "Frequency", datasets[name])
+        (chi2, df, p) = chi_square_test(datasets[name], stats.expon(scale = 1 / lam), 1)
+        print(name, "exponential chi-square:", chi2, "df:", df, "p:", p)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Fit input models to the inspection and assembly time data")
+    parser.add_argument("--fit", action = "store_true", help = "fit every candidate distribution without any plots and write the parameter file")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant and its data files")
+    parser.add_argument("-o", "--output", default = DATA_FOLDER + PARAMETER_FILE, help = "parameter file to write")
+    args = parser.parse_args()
+
+    topology = Topology.load(args.topology)
+    if args.fit:
+        report(fit_all(topology, DATA_FOLDER, args.output))
+        print("PARAMETERS STORED IN FILE \"", args.output, "\"")
+    else:
+        files = topology.dataFiles()
+        datasets = dict((name, load_times(DATA_FOLDER + files[name])) for name in files)
+        do_qq_plots(datasets, "norm")
+        do_qq_plots(datasets, "expon")
+        do_histograms(datasets)
@@ -0,0 +1,89 @@
+import functools
+import os
+import numpy as np
+
+from rng import VariateStream, BLOCK_SIZE, exponentialTransform
+
+#define the input modes, i.e. where the inspection and assembly times come from
+#exponential: sampled from the exponential distribution fitted to each data file
+#empirical: sampled from the recorded times of each data file, each equally likely
+#trace: the recorded times of each data file replayed in order
+INPUT_EXPONENTIAL = "exponential"
+INPUT_EMPIRICAL = "empirical"
+INPUT_TRACE = "trace"
+INPUT_MODES = [INPUT_EXPONENTIAL, INPUT_EMPIRICAL, INPUT_TRACE]
+
+#returns the name of the binary copy of a data file
+def binaryFileName(filename):
+    return os.path.splitext(filename)[0] + ".npy"
+
+#returns the times of a data file as a read-only memory-mapped array
+#the text file is parsed once into a binary .npy copy next to it, which is mapped on every later call
+#the copy is rebuilt whenever the text file is newer, so the data is never loaded into a Python list
+def loadTimes(filename):
+    binary = binaryFileName(filename)
+    if not os.path.exists(binary) or os.path.getmtime(binary) < os.path.getmtime(filename):
+        np.save(binary, np.fromfile(filename, sep = " "))
+    return np.load(binary, mmap_mode = "r")
+
+#returns the times a stream of the given input mode draws from: the sorted times for the empirical mode, and the times in
+#their recorded order for the trace mode
+#sorting is done once per config, so every simulation built from it shares the same table
+def prepareTimes(mode, times):
+    if mode == INPUT_EMPIRICAL:
+        return np.sort(times)
+    return times
+
+#returns a transform from uniform numbers to times drawn from the empirical distribution of the given sorted times
+#the sorted times are the inverse-CDF table: u falls in one of n equally likely cells, and cell k holds the k-th smallest time,
+#so each draw is one index into the table no matter how many times were recorded
+def empiricalTransform(table):
+    return functools.partial(empiricalVariates, table)
+
+#returns the times of the sorted table chosen by each of an array of uniform numbers
+def empiricalVariates(table, u):
+    n = len(table)
+    return table[np.minimum((u * n).astype(np.int64), n - 1)]
+
+#defines a stream of times that replays the recorded times of a data file in order, starting over at the end
+#it hands out the times in the same blocks as a VariateStream, so it can be used in its place
+class TraceStream():
+    __slots__ = ("times", "size", "position", "values")
+    #creates the stream from an array of times, usually memory-mapped, replaying them from the given position
+    def __init__(self, times, size = BLOCK_SIZE, position = 0):
+        if len(times) == 0:
+            raise ValueError("cannot replay an empty data file")
+        self.times = times
+        self.size = size
+        self.position = position
+        self.values = iter(())
+    #moves the stream to a starting position drawn from the given generator, discarding the times already copied out
+    def seek(self, generator):
+        self.position = traceOffset(generator, len(self.times))
+        self.values = iter(())
+    #returns the next recorded time, copying the next block out of the array when the current one is used up
+    def next(self):
+        for value in self.values:
+            return value
+        end = min(self.position + self.size, len(self.times))
+        self.values = iter(self.times[self.position:end].tolist())
+        self.position = end % len(self.times)
+        return next(self.values)
+
+#returns the position a trace of n times is replayed from, drawn from the generator of its stream
+#every replication has its own generator, so each replays the traces from its own place instead of all of them replaying the
+#same times, which would make them copies of one another
+def traceOffset(generator, n):
+    return int(generator.getRandomNumber() * n)
+
+#returns the stream of times of one data file in the given input mode, from its fitted lambda and its prepared times
+#in the trace mode the random number generator only chooses where the replay starts, but every mode is given its own substream
+#so the component choices draw the same random numbers in every mode
+def timeStream(mode, generator, lam, times = None, antithetic = False):
+    if mode == INPUT_EXPONENTIAL:
+        return VariateStream(generator, exponentialTransform(lam), antithetic = antithetic)
+    if mode == INPUT_EMPIRICAL:
+        return VariateStream(generator, empiricalTransform(times), antithetic = antithetic)
+    if mode == INPUT_TRACE:
+        return TraceStream(times, position = traceOffset(generator, len(times)))
+    raise ValueError("unknown input mode " + str(mode))
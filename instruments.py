@@ -0,0 +1,190 @@
+import argparse
+import json
+import time
+
+from accumulators import WelfordAccumulator, TimeWeightedAccumulator
+
+#the abbreviation of each event class, as used in the event trace
+EVENT_ABBREVIATIONS = {"BeginInspectionEvent": "BIE",
+                       "FinishInspectionEvent": "FIE",
+                       "BufferFillEvent": "BFE",
+                       "BeginAssemblyEvent": "BAE",
+                       "FinishAssemblyEvent": "FAE",
+                       "MeasureEvent": "ME"}
+
+#the number of simulated minutes between samples of the FEL length
+DEFAULT_SAMPLE_INTERVAL = 100
+
+#defines a stream of variates that counts the variates drawn from the stream it wraps
+class CountingStream():
+    __slots__ = ("stream", "count")
+    #creates the counting stream around a VariateStream or TraceStream
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+    #returns the next variate of the wrapped stream
+    def next(self):
+        self.count += 1
+        return self.stream.next()
+
+#defines the instrumentation of one simulation run
+#a simulation started with instruments runs a separate event loop that records them, so a simulation without them
+#runs the same loop as before and pays nothing for them
+#the instruments record:
+#  the number of events of each class and the time spent in their execute() methods
+#  the length of the FEL, time-weighted and sampled every sampleInterval simulated minutes
+#  the number of variates drawn from each random number stream
+#  the blocking episodes of each inspector
+class Instruments():
+    #creates empty instruments
+    def __init__(self, sampleInterval = DEFAULT_SAMPLE_INTERVAL):
+        self.sampleInterval = sampleInterval
+        self.clock = time.perf_counter
+        self.eventCounts = {}
+        self.eventTimes = {}
+        self.FELLength = TimeWeightedAccumulator()
+        self.maxFELLength = 0
+        self.FELSamples = []
+        self.nextSampleTime = 0
+        self.streams = {}
+        self.blocking = {}
+        self.blockedSince = {}
+        self.loopTime = 0.0
+
+    #wraps the variate streams of a freshly started simulation in counting streams
+    def attach(self, sim):
+        for inspector in sim.inspectors:
+            for c in inspector.inspectionTimes:
+                inspector.inspectionTimes[c] = self.countStream(sim, inspector.inspectionTimes[c])
+            if inspector.componentChoice != None:
+                inspector.componentChoice = self.countStream(sim, inspector.componentChoice)
+            self.blocking[inspector.id] = WelfordAccumulator()
+            self.blockedSince[inspector.id] = None
+        for workstation in sim.workstations:
+            workstation.assemblyTimes = self.countStream(sim, workstation.assemblyTimes)
+        self.FELLength = TimeWeightedAccumulator(len(sim.FEL), sim.now)
+        self.nextSampleTime = sim.now
+
+    #returns a counting stream around the given variate stream of the simulation, and records it under its stream name
+    def countStream(self, sim, stream):
+        for name in sim.variates:
+            if sim.variates[name] is stream:
+                self.streams[name] = CountingStream(stream)
+                sim.variates[name] = self.streams[name]
+                return self.streams[name]
+        raise ValueError("stream is not one of the simulation's variate streams")
+
+    #executes every event up to the given time, like Simulation.advance, while recording the instruments
+    def advance(self, sim, until):
+        FEL = sim.FEL
+        trace = sim.trace
+        clock = self.clock
+        counts = self.eventCounts
+        times = self.eventTimes
+        inspectors = sim.inspectors
+        executed = 0
+        loop_start = clock()
+        while len(FEL) > 0 and FEL[0][0] <= until:
+            event = sim.popFromFEL()
+            if trace != None:
+                event.trace(trace)
+            event_class = type(event)
+            start = clock()
+            event.execute(sim)
+            elapsed = clock() - start
+            if event_class in counts:
+                counts[event_class] += 1
+                times[event_class] += elapsed
+            else:
+                counts[event_class] = 1
+                times[event_class] = elapsed
+            executed += 1
+            #record the FEL length after the event, which is the event removed plus the events it scheduled
+            now = event.time
+            self.FELLength.change(now, len(FEL) - self.FELLength.value)
+            if len(FEL) > self.maxFELLength:
+                self.maxFELLength = len(FEL)
+            while self.nextSampleTime <= now:
+                self.FELSamples.append((self.nextSampleTime, len(FEL)))
+                self.nextSampleTime += self.sampleInterval
+            #a blocking episode starts when an inspector starts waiting for buffer space, and ends when it stops
+            for i in inspectors:
+                if i.waiting != False and self.blockedSince[i.id] == None:
+                    self.blockedSince[i.id] = now
+                elif i.waiting == False and self.blockedSince[i.id] != None:
+                    self.blocking[i.id].add(now - self.blockedSince[i.id])
+                    self.blockedSince[i.id] = None
+        self.loopTime += clock() - loop_start
+        return executed
+
+    #returns the recorded instruments as a dictionary that can be written as JSON
+    #blocking episodes still in progress at the given time are not counted
+    def toDict(self, now):
+        events = {}
+        for event_class in self.eventCounts:
+            name = EVENT_ABBREVIATIONS.get(event_class.__name__, event_class.__name__)
+            events[name] = {"count": self.eventCounts[event_class],
+                            "time": self.eventTimes[event_class],
+                            "timePerEvent": self.eventTimes[event_class] / self.eventCounts[event_class]}
+        blocking = {}
+        for id in self.blocking:
+            episodes = self.blocking[id]
+            blocking[str(id)] = {"episodes": episodes.count,
+                                 "totalTime": episodes.count * episodes.mean,
+                                 "meanTime": episodes.getMean(),
+                                 "blockedNow": self.blockedSince[id] != None}
+        return {"loopTime": self.loopTime,
+                "events": events,
+                "FEL": {"averageLength": self.FELLength.getMean(now),
+                        "maxLength": self.maxFELLength,
+                        "sampleInterval": self.sampleInterval,
+                        "samples": self.FELSamples},
+                "variates": dict((name, self.streams[name].count) for name in self.streams),
+                "blocking": blocking}
+
+    #writes the time spent in each event class in the folded stack format read by flame graph tools,
+    #one "advance;<event> <microseconds>" line per event class, with the rest of the loop, including the instruments themselves, under "advance"
+    def writeFlamegraph(self, output_file):
+        executing = 0
+        for event_class in self.eventCounts:
+            name = EVENT_ABBREVIATIONS.get(event_class.__name__, event_class.__name__)
+            output_file.write("advance;" + name + " " + str(round(1e6 * self.eventTimes[event_class])) + "\n")
+            executing += self.eventTimes[event_class]
+        output_file.write("advance " + str(round(1e6 * max(0, self.loopTime - executing))) + "\n")
+
+if __name__ == "__main__":
+    from sim import Config, Simulation, DATA_FOLDER
+    from topology import Topology, DEFAULT_TOPOLOGY
+    from inputs import INPUT_MODES, INPUT_EXPONENTIAL
+
+    parser = argparse.ArgumentParser(description = "Run the simulation with instrumentation of its event loop")
+    parser.add_argument("-t", "--stop-time", type = int, default = 100000, help = "minutes to run the simulation for")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the random number streams")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("--input", choices = INPUT_MODES, default = INPUT_EXPONENTIAL, help = "where the inspection and assembly times come from, see sim.py")
+    parser.add_argument("--sample-interval", type = float, default = DEFAULT_SAMPLE_INTERVAL, help = "simulated minutes between samples of the FEL length")
+    parser.add_argument("-o", "--output", default = "output/instruments.json", help = "json file the instruments are written to")
+    parser.add_argument("--flamegraph", default = None, help = "file the event times are written to in the folded stack format")
+    args = parser.parse_args()
+
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology), args.input)
+    instruments = Instruments(args.sample_interval)
+    sim = Simulation(config, args.seed)
+    sim.run(args.stop_time, instruments = instruments)
+    data = instruments.toDict(sim.now)
+    for name in data["events"]:
+        e = data["events"][name]
+        print("%-4s %9d events | %8.3f s | %6.2f us/event" % (name, e["count"], e["time"], 1e6 * e["timePerEvent"]))
+    print("FEL: average length", data["FEL"]["averageLength"], "| max length", data["FEL"]["maxLength"])
+    for name in data["variates"]:
+        print("Stream", name, "|", data["variates"][name], "variates")
+    for id in data["blocking"]:
+        b = data["blocking"][id]
+        print("Inspector", id, "|", b["episodes"], "blocking episodes | mean", b["meanTime"], "min | total", b["totalTime"], "min")
+    with open(args.output, "w") as f:
+        json.dump(data, f, indent = 4)
+    print("INSTRUMENTS STORED IN FILE \"", args.output, "\"")
+    if args.flamegraph != None:
+        with open(args.flamegraph, "w") as f:
+            instruments.writeFlamegraph(f)
+        print("FLAME GRAPH STACKS STORED IN FILE \"", args.flamegraph, "\"")
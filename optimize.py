@@ -0,0 +1,150 @@
+import argparse
+import json
+import multiprocessing
+import numpy as np
+
+from sim import Config, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from inputs import INPUT_EXPONENTIAL
+from sweep import initWorker, expandGrid, applyScenario, runJob, writeTable
+from cache import ResultCache, resultKey, cachedRun
+
+#defines the fully sequential ranking-and-selection procedure of Kim and Nelson (KN) for the candidate with the largest mean
+#every candidate gets n0 replications first, from which the variance of the difference of every pair of candidates is estimated;
+#after that, a candidate is dropped as soon as its mean falls further below that of another remaining candidate than the
+#procedure allows for r replications, and the allowance shrinks as r grows, so clearly inferior candidates are dropped after few
+#replications and only the close ones are simulated further
+#with probability at least 1 - alpha, the candidate selected is the best one, or within delta of the best one
+#the replications of every candidate must be paired, e.g. replication r of every candidate uses random number stream r, which
+#makes the differences less variable and the procedure stop sooner
+class RankingAndSelection():
+    #creates the procedure for k candidates, with n0 first-stage replications, indifference zone delta and error probability alpha
+    def __init__(self, k, n0, delta, alpha = 0.05):
+        if n0 < 2:
+            raise ValueError("at least 2 first-stage replications are needed")
+        self.k = k
+        self.n0 = n0
+        self.delta = delta
+        eta = 0.5 * ((2 * alpha / max(k - 1, 1)) ** (-2 / (n0 - 1)) - 1)
+        self.h2 = 2 * eta * (n0 - 1)
+        self.observations = [[] for i in range(k)]
+        self.survivors = list(range(k))
+        #the number of replications each candidate had when it was dropped, keyed by candidate
+        self.eliminatedAt = {}
+        self.variances = None
+
+    #adds the observations of the next replications of a candidate
+    def add(self, candidate, values):
+        self.observations[candidate].extend(values)
+
+    #drops every remaining candidate that is clearly worse than another one after their first r replications
+    def screen(self, r):
+        if self.variances == None:
+            first = np.array([self.observations[i][:self.n0] for i in range(self.k)])
+            self.variances = {}
+            for i in range(self.k):
+                for l in range(self.k):
+                    if i != l:
+                        self.variances[(i, l)] = np.var(first[i] - first[l], ddof = 1)
+        means = dict((i, np.mean(self.observations[i][:r])) for i in self.survivors)
+        kept = []
+        for i in self.survivors:
+            worse = False
+            for l in self.survivors:
+                if l != i:
+                    allowance = max(0, self.delta / (2 * r) * (self.h2 * self.variances[(i, l)] / self.delta ** 2 - r))
+                    if means[i] < means[l] - allowance:
+                        worse = True
+                        break
+            if worse:
+                self.eliminatedAt[i] = r
+            else:
+                kept.append(i)
+        self.survivors = kept
+
+    #returns whether the procedure has finished after r replications: one candidate is left, or the allowance is 0 for every
+    #remaining pair, so the one with the largest mean is selected
+    def finished(self, r):
+        if len(self.survivors) == 1:
+            return True
+        return all(self.h2 * self.variances[(i, l)] / self.delta ** 2 <= r for i in self.survivors for l in self.survivors if i != l)
+
+    #returns the remaining candidate with the largest mean
+    def best(self):
+        return max(self.survivors, key = lambda i: np.mean(self.observations[i]))
+
+#returns the value of a replication to maximize: its throughput less the cost of the buffer capacity of its topology,
+#in products per minute given up per unit of capacity
+def objective(metrics, topology, capacity_cost):
+    return metrics["Throughput"] - capacity_cost * sum(b["capacity"] for b in topology.buffers)
+
+#searches the routing rules, priorities and buffer capacities of a grid, like a sweep grid, for the scenario with the largest
+#objective, with the KN procedure on paired replications, and returns one row per scenario
+#the replications of a stage of every remaining scenario run together across a pool of worker processes
+#if a result cache is given, replications already in it are not run again
+def optimize(spec, workers = None, cache = None):
+    topology_file = spec.get("topology", DEFAULT_TOPOLOGY)
+    seed = spec.get("seed", 0)
+    stop_time = spec.get("stopTime", 10000)
+    input_mode = spec.get("input", INPUT_EXPONENTIAL)
+    capacity_cost = spec.get("capacityCost", 0)
+    n0 = spec.get("initialReplications", 10)
+    step = spec.get("step", 5)
+    max_replications = spec.get("maxReplications", 200)
+    scenarios = expandGrid(spec["factors"])
+    #check every scenario before starting any replication
+    base = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file), input_mode)
+    configs = [base.withTopology(applyScenario(base.topology, scenario)) for scenario in scenarios]
+    procedure = RankingAndSelection(len(scenarios), n0, spec.get("delta", 0.0005), spec.get("alpha", 0.05))
+    with multiprocessing.Pool(workers, initializer = initWorker, initargs = (topology_file, input_mode)) as pool:
+        done = 0
+        r = n0
+        while True:
+            jobs = []
+            for index in procedure.survivors:
+                for replication in range(done, r):
+                    key = resultKey(configs[index], seed, replication, stop_time)
+                    jobs.append((key, (index, scenarios[index], replication, seed, stop_time)))
+            metrics = cachedRun(cache, jobs, lambda missing: pool.map(runJob, missing))
+            for ((key, (index, scenario, replication, seed, stop_time)), m) in zip(jobs, metrics):
+                procedure.add(index, [objective(m, configs[index].topology, capacity_cost)])
+            procedure.screen(r)
+            print("STAGE:", r, "replications,", len(procedure.survivors), "of", len(scenarios), "scenarios left")
+            if procedure.finished(r) or r >= max_replications:
+                break
+            done = r
+            r = min(r + step, max_replications)
+    best = procedure.best()
+    rows = []
+    for index in range(len(scenarios)):
+        row = {"scenario": index}
+        row.update(scenarios[index])
+        row["replications"] = len(procedure.observations[index])
+        row["objective mean"] = np.mean(procedure.observations[index])
+        row["eliminated at"] = procedure.eliminatedAt.get(index, "")
+        row["selected"] = index == best
+        rows.append(row)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Find the routing rules and buffer capacities with the largest throughput by ranking and selection")
+    parser.add_argument("spec", help = "json file describing the candidates and the procedure, see config/optimize_example.json")
+    parser.add_argument("-o", "--output", default = "output/optimize_results.csv", help = "csv file with one row per scenario")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (default: all cores)")
+    parser.add_argument("--cache", default = None, help = "result cache file; replications already in it are not run again")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    cache = ResultCache(args.cache) if args.cache != None else None
+    rows = optimize(spec, args.workers, cache)
+    if cache != None:
+        print("CACHE:", cache.hits, "hits,", cache.misses, "misses")
+        cache.close()
+    writeTable(rows, args.output)
+    best = [row for row in rows if row["selected"]][0]
+    print("SELECTED SCENARIO", best["scenario"], "|", ", ".join(name + ": " + str(best[name]) for name in spec["factors"]),
+          "| objective", best["objective mean"], "over", best["replications"], "replications")
+    print("REPLICATIONS RUN:", sum(row["replications"] for row in rows), "| A FULL SWEEP OF", len(rows), "SCENARIOS TO THE SAME DEPTH WOULD RUN",
+          len(rows) * max(row["replications"] for row in rows))
+    print("RESULTS STORED IN FILE \"", args.output, "\"")
@@ -0,0 +1,163 @@
+import argparse
+import math
+import multiprocessing
+import scipy.stats as stats
+
+from sim import Config, Simulation, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from inputs import INPUT_EXPONENTIAL, INPUT_MODES
+from cache import ResultCache, resultKey, cachedRun
+
+#the configs used by the replications run in this process, set once when a worker starts
+worker_configs = None
+
+#the message of the error raised when antithetic replications cannot be paired into at least 2 pairs
+ANTITHETIC_COUNT_ERROR = "antithetic replications need an even number of replications of at least 4, so there are at least 2 pairs"
+
+#stores the configs in the worker process so they are not sent again with every replication
+def initWorker(configs):
+    global worker_configs
+    worker_configs = configs
+
+#runs a single replication of one of the configs and returns its metrics
+#replication i uses random number stream i of the master seed, so its results only depend on its index and not on the number of workers
+#every entity has its own substream, so replication i of two configs draws the same inspection and assembly times for the same
+#entities, which makes comparisons of configs use common random numbers
+def runReplication(args):
+    (scenario, master_seed, replication, stop_time, antithetic) = args
+    return Simulation(worker_configs[scenario], master_seed, replication, antithetic).run(stop_time).metrics()
+
+#returns the mean, sample variance and confidence interval half-width of the given values
+def confidenceInterval(values, confidence = 0.95):
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return (mean, float("nan"), float("nan"))
+    variance = sum((x - mean) ** 2 for x in values) / (n - 1)
+    half_width = stats.t.ppf((1 + confidence) / 2, n - 1) * math.sqrt(variance / n)
+    return (mean, variance, half_width)
+
+#holds the metrics of every replication and their confidence intervals
+class ReplicationSummary():
+    #creates the summary from the list of per-replication metric dictionaries
+    def __init__(self, replications, confidence = 0.95):
+        self.replications = replications
+        self.confidence = confidence
+        self.intervals = {}
+        for name in replications[0]:
+            values = [r[name] for r in replications]
+            self.intervals[name] = confidenceInterval(values, confidence)
+    #prints the mean, variance and half-width of every metric
+    def report(self):
+        print("REPLICATIONS:", len(self.replications), "| CONFIDENCE:", str(100 * self.confidence) + "%")
+        print("%-36s %16s %16s %16s" % ("Metric", "Mean", "Variance", "Half-width"))
+        for name in self.intervals:
+            (mean, variance, half_width) = self.intervals[name]
+            print("%-36s %16.6f %16.6f %16.6f" % (name, mean, variance, half_width))
+
+#runs the given replication jobs across a pool of worker processes, or in this process if workers is 1
+def runJobs(configs, jobs, workers = None):
+    if workers == 1:
+        initWorker(configs)
+        return [runReplication(job) for job in jobs]
+    with multiprocessing.Pool(workers, initializer = initWorker, initargs = (configs,)) as pool:
+        return pool.map(runReplication, jobs)
+
+#returns the cache keys and jobs of n replications of one of the configs, using the streams from the given first replication on
+#with antithetic variates the replications are n / 2 pairs, each of a stream used normally and the same stream used antithetically,
+#so n must be even and at least 4 for the pairs to give a confidence interval
+def replicationJobs(configs, scenario, n, stop_time, master_seed, antithetic = False, first = 0):
+    jobs = []
+    if antithetic:
+        if n < 4 or n % 2 != 0:
+            raise ValueError(ANTITHETIC_COUNT_ERROR)
+        for replication in range(first, first + n // 2):
+            for a in [False, True]:
+                jobs.append((resultKey(configs[scenario], master_seed, replication, stop_time, a), (scenario, master_seed, replication, stop_time, a)))
+    else:
+        for replication in range(first, first + n):
+            jobs.append((resultKey(configs[scenario], master_seed, replication, stop_time), (scenario, master_seed, replication, stop_time, False)))
+    return jobs
+
+#returns the average of every pair of consecutive replications; the averages of antithetic pairs are independent observations
+def pairAverages(replications):
+    return [dict((name, (a[name] + b[name]) / 2) for name in a) for (a, b) in zip(replications[0::2], replications[1::2])]
+
+#runs n independent replications of the given length across a pool of worker processes
+#with antithetic variates, the confidence intervals are computed from the averages of the n / 2 antithetic pairs
+#if a result cache is given, replications already in it are not run again
+def runReplications(config, n, stop_time, master_seed = 0, workers = None, confidence = 0.95, cache = None, antithetic = False):
+    jobs = replicationJobs([config], 0, n, stop_time, master_seed, antithetic)
+    replications = cachedRun(cache, jobs, lambda missing: runJobs([config], missing, workers))
+    if antithetic:
+        replications = pairAverages(replications)
+    return ReplicationSummary(replications, confidence)
+
+#holds the paired comparison of two configs: the confidence interval of the difference of every metric, second minus first
+#the variance ratio of a metric is the variance its difference would have with independent runs of the two configs, divided by
+#the variance of the paired difference; it is the factor by which the pairing reduces the replications needed for a precision
+class PairedComparison():
+    #creates the comparison from the metrics of the paired replications of the two configs
+    def __init__(self, first, second, confidence = 0.95):
+        self.first = ReplicationSummary(first, confidence)
+        self.second = ReplicationSummary(second, confidence)
+        self.confidence = confidence
+        self.differences = [dict((name, b[name] - a[name]) for name in a) for (a, b) in zip(first, second)]
+        self.intervals = {}
+        self.varianceRatio = {}
+        for name in self.differences[0]:
+            self.intervals[name] = confidenceInterval([d[name] for d in self.differences], confidence)
+            independent = self.first.intervals[name][1] + self.second.intervals[name][1]
+            variance = self.intervals[name][1]
+            self.varianceRatio[name] = independent / variance if variance > 0 else float("inf")
+    #prints the mean of every metric of both configs, and the difference with its half-width and variance ratio
+    def report(self):
+        print("PAIRS:", len(self.differences), "| CONFIDENCE:", str(100 * self.confidence) + "%")
+        print("%-36s %14s %14s %14s %14s %10s" % ("Metric", "First", "Second", "Difference", "Half-width", "Var ratio"))
+        for name in self.intervals:
+            (mean, variance, half_width) = self.intervals[name]
+            print("%-36s %14.6f %14.6f %14.6f %14.6f %10.2f" % (name, self.first.intervals[name][0], self.second.intervals[name][0], mean, half_width, self.varianceRatio[name]))
+
+#runs n replications of each of two configs and compares them pairwise
+#with common random numbers, replication i of both configs uses stream i; otherwise the second config uses the streams after those
+#of the first, so the pairs are independent
+#with antithetic variates, each config runs n / 2 antithetic pairs and the pairs are compared through their averages
+def compareConfigs(configs, n, stop_time, master_seed = 0, workers = None, confidence = 0.95, cache = None, common = True, antithetic = False):
+    first_jobs = replicationJobs(configs, 0, n, stop_time, master_seed, antithetic)
+    second_jobs = replicationJobs(configs, 1, n, stop_time, master_seed, antithetic, 0 if common else n)
+    results = cachedRun(cache, first_jobs + second_jobs, lambda missing: runJobs(configs, missing, workers))
+    first = results[:len(first_jobs)]
+    second = results[len(first_jobs):]
+    if antithetic:
+        first = pairAverages(first)
+        second = pairAverages(second)
+    return PairedComparison(first, second, confidence)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run independent replications of the simulation and report confidence intervals")
+    parser.add_argument("-n", "--replications", type = int, default = 30, help = "number of replications")
+    parser.add_argument("-t", "--stop-time", type = int, default = 10000, help = "minutes to run each replication for")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "master seed the replication streams are derived from")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (default: all cores)")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("--input", choices = INPUT_MODES, default = INPUT_EXPONENTIAL, help = "where the inspection and assembly times come from, see sim.py")
+    parser.add_argument("-c", "--confidence", type = float, default = 0.95, help = "confidence level of the intervals")
+    parser.add_argument("--cache", default = None, help = "result cache file; replications already in it are not run again")
+    parser.add_argument("--antithetic", action = "store_true", help = "run the replications as antithetic pairs")
+    parser.add_argument("--compare", default = None, help = "json file of a second plant to compare against the first with paired replications")
+    parser.add_argument("--independent", action = "store_true", help = "compare the plants on independent random numbers instead of common random numbers")
+    args = parser.parse_args()
+    if args.antithetic and (args.replications < 4 or args.replications % 2 != 0):
+        parser.error(ANTITHETIC_COUNT_ERROR)
+
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology), args.input)
+    cache = ResultCache(args.cache) if args.cache != None else None
+    if args.compare != None:
+        configs = [config, config.withTopology(Topology.load(args.compare))]
+        summary = compareConfigs(configs, args.replications, args.stop_time, args.seed, args.workers, args.confidence, cache, not args.independent, args.antithetic)
+    else:
+        summary = runReplications(config, args.replications, args.stop_time, args.seed, args.workers, args.confidence, cache, args.antithetic)
+    summary.report()
+    if cache != None:
+        print("CACHE:", cache.hits, "hits,", cache.misses, "misses")
+        cache.close()
@@ -0,0 +1,185 @@
+import functools
+import numpy as np
+
+#moduli and multipliers of the two components of L'Ecuyer's MRG32k3a combined multiple recursive generator
+#the generator has a period of about 2^191
+M1 = 4294967087
+M2 = 4294944443
+A12 = 1403580
+A13N = 810728
+A21 = 527612
+A23N = 1370589
+NORM = 1.0 / (M1 + 1)
+
+#transition matrices of the two components, acting on the state column (x[n-3], x[n-2], x[n-1])
+A1 = [[0, 1, 0], [0, 0, 1], [M1 - A13N, A12, 0]]
+A2 = [[0, 1, 0], [0, 0, 1], [M2 - A23N, 0, A21]]
+
+#distance between the starts of consecutive substreams (one per entity) and streams (one per replication)
+SUBSTREAM_LENGTH = 2 ** 76
+STREAM_LENGTH = 2 ** 127
+
+#returns the product of two 3x3 matrices modulo m
+def matMult(A, B, m):
+    C = [[0, 0, 0], [0, 0, 0], [0, 0, 0]]
+    for i in range(3):
+        for j in range(3):
+            C[i][j] = (A[i][0] * B[0][j] + A[i][1] * B[1][j] + A[i][2] * B[2][j]) % m
+    return C
+
+#returns the product of a 3x3 matrix and a vector of length 3 modulo m
+def matVecMult(A, v, m):
+    return [(A[i][0] * v[0] + A[i][1] * v[1] + A[i][2] * v[2]) % m for i in range(3)]
+
+#returns the matrix A raised to the power e modulo m using binary exponentiation, so it costs O(log e)
+def matPow(A, e, m):
+    result = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    square = A
+    while e > 0:
+        if e & 1:
+            result = matMult(square, result, m)
+        square = matMult(square, square, m)
+        e >>= 1
+    return result
+
+#creates an MRG32k3a generator to generate numbers strictly between 0 and 1
+class MRG32k3a():
+    #creates the generator from a state of 6 integers
+    #the first 3 must be below M1 and not all 0, the last 3 below M2 and not all 0
+    def __init__(self, state = (12345, 12345, 12345, 12345, 12345, 12345)):
+        self.s1 = list(state[:3])
+        self.s2 = list(state[3:])
+    #returns a random number between 0 and 1, never exactly 0 or 1
+    def getRandomNumber(self):
+        s1 = self.s1
+        s2 = self.s2
+        p1 = (A12 * s1[1] - A13N * s1[0]) % M1
+        s1[0] = s1[1]
+        s1[1] = s1[2]
+        s1[2] = p1
+        p2 = (A21 * s2[2] - A23N * s2[0]) % M2
+        s2[0] = s2[1]
+        s2[1] = s2[2]
+        s2[2] = p2
+        if p1 > p2:
+            return (p1 - p2) * NORM
+        return (p1 - p2 + M1) * NORM
+    #moves the generator forward by n numbers in O(log n) time, without generating them
+    def advance(self, n):
+        self.s1 = matVecMult(matPow(A1, n, M1), self.s1, M1)
+        self.s2 = matVecMult(matPow(A2, n, M2), self.s2, M2)
+    #returns the current state as a tuple of 6 integers
+    def getState(self):
+        return tuple(self.s1 + self.s2)
+    #returns an independent copy of this generator at the same position
+    def clone(self):
+        return MRG32k3a(self.getState())
+
+#derives a valid MRG32k3a starting state from an integer seed
+def seedState(seed):
+    words = np.random.SeedSequence(seed).generate_state(6, dtype = np.uint64)
+    state = [int(words[i]) % M1 for i in range(3)] + [int(words[i]) % M2 for i in range(3, 6)]
+    if state[0] == state[1] == state[2] == 0:
+        state[0] = 1
+    if state[3] == state[4] == state[5] == 0:
+        state[3] = 1
+    return tuple(state)
+
+#defines the set of random number streams used by one replication
+#each replication gets its own stream, 2^127 numbers apart, and each entity gets its own substream of that stream, 2^76 numbers apart
+class RandomStreams():
+    #creates the streams of the given replication from the seed
+    def __init__(self, seed = 0, replication = 0):
+        self.seed = seed
+        self.replication = replication
+        self.start = MRG32k3a(seedState(seed))
+        self.start.advance(replication * STREAM_LENGTH)
+        self.streams = {}
+    #returns the generator of the substream with the given index, creating it the first time it is used
+    def getStream(self, index):
+        if index not in self.streams:
+            stream = self.start.clone()
+            stream.advance(index * SUBSTREAM_LENGTH)
+            self.streams[index] = stream
+        return self.streams[index]
+
+#the number of variates generated at once by a variate stream
+BLOCK_SIZE = 4096
+
+#cache of block matrices, keyed by block size
+block_matrices = {}
+
+#returns, for each component, the matrix whose row j gives x[n+j+1] from the state (x[n-2], x[n-1], x[n])
+#row j is the last row of A^(j+1), so a whole block of the sequence can be computed at once from one state
+def getBlockMatrices(size):
+    if size not in block_matrices:
+        matrices = []
+        for (A, m) in [(A1, M1), (A2, M2)]:
+            rows = []
+            row = A[2]
+            for j in range(size):
+                rows.append(row)
+                row = [(row[0] * A[0][k] + row[1] * A[1][k] + row[2] * A[2][k]) % m for k in range(3)]
+            matrices.append(np.array(rows, dtype = np.int64))
+        block_matrices[size] = matrices
+    return block_matrices[size]
+
+#returns (R @ s) % m without overflowing 64-bit integers by splitting the state into 16-bit halves
+def blockMult(R, s, m):
+    s = np.array(s, dtype = np.int64)
+    high = (R @ (s >> 16)) % m
+    low = R @ (s & 0xFFFF)
+    return ((high << 16) + low) % m
+
+#returns the next size numbers of the generator as a NumPy array and moves the generator past them
+#the numbers are exactly the ones that size calls to getRandomNumber would return
+def getUniformBlock(generator, size):
+    (R1, R2) = getBlockMatrices(size)
+    p1 = blockMult(R1, generator.s1, M1)
+    p2 = blockMult(R2, generator.s2, M2)
+    generator.s1 = [int(x) for x in p1[-3:]]
+    generator.s2 = [int(x) for x in p2[-3:]]
+    d = p1 - p2
+    d[d <= 0] += M1
+    return d * NORM
+
+#defines a stream of variates that are generated in blocks and handed out one at a time
+#each block of uniform numbers is transformed at once by the given function, e.g. the inverse transform of a distribution
+#an antithetic stream transforms 1 - u instead of u, so its variates are negatively correlated with those of the normal stream
+class VariateStream():
+    #creates the stream from a generator and a function that transforms an array of uniform numbers into variates
+    def __init__(self, generator, transform, size = BLOCK_SIZE, antithetic = False):
+        self.generator = generator
+        self.transform = transform
+        self.size = size
+        self.antithetic = antithetic
+        self.values = iter(())
+    #returns the next variate, generating a new block when the current one is used up
+    def next(self):
+        for value in self.values:
+            return value
+        u = getUniformBlock(self.generator, self.size)
+        if self.antithetic:
+            u = 1 - u
+        self.values = iter(self.transform(u).tolist())
+        return next(self.values)
+
+#returns exponential variates with the given lambda parameter from an array of uniform numbers
+def exponentialVariates(lam, u):
+    return -1 / lam * np.log(u)
+
+#returns a transform from uniform numbers to exponential variates with the given lambda parameter
+#transforms are partial applications of module-level functions rather than lambdas, so streams can be pickled in snapshots
+def exponentialTransform(lam):
+    return functools.partial(exponentialVariates, lam)
+
+#returns the index of the outcome chosen by each of an array of uniform numbers, given the cumulative probabilities of the outcomes
+def chooseOutcomes(cumulative, u):
+    return np.searchsorted(cumulative, u, side = "right")
+
+#returns a transform from uniform numbers to the index of an outcome chosen with the given probabilities
+#outcome k is chosen when u falls below the cumulative probability of outcomes 0 to k, so for 2 equal outcomes it is 0 when u < 0.5
+def choiceTransform(probabilities):
+    cumulative = np.cumsum(probabilities)
+    cumulative[-1] = 1.0
+    return functools.partial(chooseOutcomes, cumulative)
@@ -0,0 +1,89 @@
+#the policies an inspector can use to choose which of its free buffers receives a component
+#a policy is a function of the routing index of an inspector and component that returns the chosen buffer; it is only called
+#when at least one of the buffers has space
+#every policy decides from the bitmasks of the index, so its cost does not grow with the number of buffers: round-robin and
+#priority take a few integer operations, and shortest-queue and idle-first look at one bitmask per buffer level at most
+ROUND_ROBIN = "round-robin"
+SHORTEST_QUEUE = "shortest-queue"
+PRIORITY = "priority"
+IDLE_FIRST = "idle-first"
+
+#defines the indexed state of the buffers an inspector can put one component type in
+#the buffers are kept in the routing order of the inspector, and buffer k of that order is bit k of every bitmask:
+#  free: the buffers with space
+#  levels: the buffers with space holding each number of components, indexed by that number
+#  idle: the buffers whose workstation is not assembling
+#  next: the position of the next buffer to try when using round-robin routing
+#the events keep the bitmasks up to date as the buffer levels and workstations change
+class RoutingIndex():
+    __slots__ = ("buffers", "free", "levels", "idle", "next")
+    #creates an empty index
+    def __init__(self):
+        self.buffers = []
+        self.free = 0
+        self.levels = []
+        self.idle = 0
+        self.next = 0
+
+    #makes the index hold the given buffers, in routing order, and builds its bitmasks from their current state
+    #the round-robin position is kept if the buffers and their order have not changed
+    def build(self, buffers):
+        if buffers != self.buffers:
+            self.next = 0
+        self.buffers = list(buffers)
+        self.free = 0
+        self.levels = [0] * max([b.maxCapacity for b in buffers], default = 0)
+        self.idle = 0
+        for k in range(len(buffers)):
+            b = buffers[k]
+            b.bit = 1 << k
+            b.route = self
+            if b.capacity < b.maxCapacity:
+                self.free |= b.bit
+                self.levels[b.capacity] |= b.bit
+            if not b.workstation.busy:
+                self.idle |= b.bit
+
+#returns the position of the lowest set bit of a non-zero bitmask
+def lowestBit(mask):
+    return (mask & -mask).bit_length() - 1
+
+#alternates which workstation gets the component: the first free buffer from the round-robin position on, after which the
+#position moves past it
+def roundRobin(index):
+    ahead = index.free >> index.next
+    if ahead != 0:
+        k = index.next + lowestBit(ahead)
+    else:
+        k = lowestBit(index.free)
+    index.next = (k + 1) % len(index.buffers)
+    return index.buffers[k]
+
+#puts the component in the buffer holding the fewest components, the first one in routing order if several hold as few
+def shortestQueue(index):
+    for mask in index.levels:
+        if mask != 0:
+            return index.buffers[lowestBit(mask)]
+
+#puts the component in the first free buffer in routing order, so the routing order is the priority of the workstations
+def priority(index):
+    return index.buffers[lowestBit(index.free)]
+
+#puts the component in the first free buffer whose workstation is idle, since it may be waiting for just this component,
+#and otherwise in the buffer holding the fewest components
+def idleFirst(index):
+    idle = index.free & index.idle
+    if idle != 0:
+        return index.buffers[lowestBit(idle)]
+    return shortestQueue(index)
+
+#the routing policies by name; registerPolicy adds more
+ROUTING_POLICIES = {ROUND_ROBIN: roundRobin,
+                    SHORTEST_QUEUE: shortestQueue,
+                    PRIORITY: priority,
+                    IDLE_FIRST: idleFirst}
+
+#makes a routing policy available to topologies under the given name
+#the policy must be a module-level function, so simulations using it can be snapshotted and sent to worker processes
+def registerPolicy(name, policy):
+    ROUTING_POLICIES[name] = policy
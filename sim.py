@@ -1,193 +1,291 @@
-import random
+import argparse
+import hashlib
+import json
+import os
 import numpy as np
+import heapq
+import io
 import math
+import pickle
+from collections import deque
 
-#create counters to test for little's law
-c1_in = 0
-c2_in = 0
-c3_in = 0
-c1_out = 0
-c2_out = 0
-c3_out = 0
-
-c1_list = []
-c2_list = []
-c3_list = []
-
-c1_times = []
-c2_times = []
-c3_times = []
-
-c1_samples = []
-c2_samples = []
-c3_samples = []
-
-#creates a linear congruential generator to generate numbers between 0 and 1
-class LinearCongruentialGenerator():
-    def __init__(self, a, c, m, x0):
-        self.a = a
-        self.c = c
-        self.m = m
-        self.x = x0
-    #returns a random number between 0 and 1
-    def getRandomNumber(self):
-        self.x = (self.a * self.x + self.c) % self.m
-        return self.x / self.m
-    
-#returns a random value from the exponential distribution defined by the given lambda parameter
-#uses a randomly generated number from 0 to 1 and the inverse transform technique
-def getExponential(lam):
-    r = 0
-    while r == 0:
-        r = lin_con_gen.getRandomNumber()
-    return -1 / lam * math.log(r)
+from rng import RandomStreams, VariateStream, choiceTransform
+from inputs import INPUT_EXPONENTIAL, INPUT_MODES, loadTimes, prepareTimes, timeStream, TraceStream
+from topology import Topology, DEFAULT_TOPOLOGY
+from routing import RoutingIndex, ROUTING_POLICIES
+import eventtrace
+from accumulators import WelfordAccumulator, TimeWeightedAccumulator
+from windowmetrics import WindowExporter
+
+#the version of the simulation engine; change it whenever a change to the engine changes the results of a run
+#cached results are only reused when they were produced by the same engine version
+ENGINE_VERSION = "2"
+
+#define the folder where inspection time and assembly time files are located
+DATA_FOLDER = "data/"
+#define the file in the data folder holding the parameters fitted by hist.py
+PARAMETER_FILE = "fitted_params.json"
+
+#the number of minutes between measurements of the number of components in the system
+MEASURE_INTERVAL = 10
 
 #calculates the MLE estimator for the lambda parameter of an exponential distribution based on the given dataset
+#np.sum adds in pairs, which is both faster and more accurate than a running sum on long data logs
 def lam_estimator(data):
-    return len(data) / sum(data)
+    return float(len(data) / np.sum(data))
+
+#returns the sha256 hash of a file
+def fileHash(filename):
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+#returns the fitted parameters of each stream stored in the given parameter file, or an empty dict if there is none
+def loadFittedParameters(filename):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        return json.load(f)["streams"]
+
+#returns a hash of everything in a config that determines how a simulation behaves
+#a snapshot can only be restored with a config of the same hash
+def configKey(config):
+    description = {"topology": config.topology.toDict(),
+                   "lambdas": dict((name, repr(float(config.lambdas[name]))) for name in config.lambdas),
+                   "measureInterval": config.measureInterval,
+                   "inputMode": config.inputMode}
+    return hashlib.sha256(json.dumps(description, sort_keys = True).encode()).hexdigest()
+
+#defines a pickler of simulation snapshots
+#the config, and the recorded times it holds in the empirical and trace input modes, are stored as references instead of copies,
+#so a snapshot only holds the state of the run
+class SnapshotPickler(pickle.Pickler):
+    #creates the pickler writing to the given file, for a simulation of the given config
+    def __init__(self, file, config):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.references = {id(config): ("config",)}
+        for name in config.times:
+            self.references[id(config.times[name])] = ("times", name)
+    #returns the reference stored in place of the object, or None to pickle the object itself
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+#defines an unpickler of simulation snapshots, which resolves the references to the config the snapshot is restored with
+class SnapshotUnpickler(pickle.Unpickler):
+    #creates the unpickler reading from the given file
+    def __init__(self, file, config):
+        pickle.Unpickler.__init__(self, file)
+        self.config = config
+    #returns the object a reference stands for
+    def persistent_load(self, reference):
+        if reference[0] == "config":
+            return self.config
+        return self.config.times[reference[1]]
+
+#defines the input model of the simulation: the plant topology and the lambda parameter of every inspection and assembly time distribution
+#a config is built once and can be shared by any number of simulations
+class Config():
+    #creates the config from a topology and the lambda parameters keyed by stream name (e.g. I1C1, W1)
+    #in the empirical and trace input modes, times holds the recorded times of each stream, keyed by stream name
+    def __init__(self, topology, lambdas, measureInterval = MEASURE_INTERVAL, inputMode = INPUT_EXPONENTIAL, times = None):
+        if inputMode not in INPUT_MODES:
+            raise ValueError("unknown input mode " + str(inputMode))
+        self.topology = topology
+        self.lambdas = lambdas
+        self.measureInterval = measureInterval
+        self.inputMode = inputMode
+        self.times = {}
+        if inputMode != INPUT_EXPONENTIAL:
+            for name in lambdas:
+                self.times[name] = prepareTimes(inputMode, times[name])
+    #creates the config by loading the inspection and assembly times of the topology from the files in the given folder
+    #the lambdas fitted by "python hist.py --fit" are used for every file that has not changed since it was fitted
+    #the empirical and trace input modes also memory-map the recorded times of every file
+    @staticmethod
+    def fromDataFolder(folder = DATA_FOLDER, topology = None, inputMode = INPUT_EXPONENTIAL):
+        if topology == None:
+            topology = Topology.load(DEFAULT_TOPOLOGY)
+        fitted = loadFittedParameters(folder + PARAMETER_FILE)
+        lambdas = {}
+        files = topology.dataFiles()
+        for name in files:
+            entry = fitted.get(name)
+            if entry != None and entry["file"] == files[name] and entry["sha256"] == fileHash(folder + files[name]):
+                lambdas[name] = entry["lambda"]
+            else:
+                lambdas[name] = lam_estimator(np.loadtxt(folder + files[name], unpack = True))
+        times = None
+        if inputMode != INPUT_EXPONENTIAL:
+            times = dict((name, loadTimes(folder + files[name])) for name in files)
+        return Config(topology, lambdas, MEASURE_INTERVAL, inputMode, times)
+    #returns a copy of the config with a different topology, sharing its input model
+    def withTopology(self, topology):
+        config = Config(topology, self.lambdas, self.measureInterval)
+        config.inputMode = self.inputMode
+        config.times = self.times
+        return config
 
 #defines an inspector entity
 class Inspector():
+    __slots__ = ("id", "components", "routes", "routing", "policy",
+                 "inspectionTimes", "componentChoice", "waiting", "waitingSinceTime", "totalWaitTime")
     #creates the inspector
-    def __init__(self, id):
+    def __init__(self, id, routing):
         self.id = id
+        self.routing = routing
+        #the routing policy function of the routing rule, see routing.py
+        self.policy = ROUTING_POLICIES[routing]
         self.waiting = False
         self.waitingSinceTime = None
         self.totalWaitTime = 0
-    #returns all buffers attached to this inspector
-    def getFreeBuffers(self, comp):
-        list = []
-        for b in BUFFERS:
-            if b.component == comp and b.capacity < 2:
-                list.append(b)
-        return list
-        
+        #the components inspected by this inspector, and the routing index of its buffers for each of them keyed by component id
+        self.components = []
+        self.routes = {}
+        #the variate streams of inspection times keyed by component id, and of the component to inspect next
+        self.inspectionTimes = {}
+        self.componentChoice = None
+    #returns the buffer that receives the component, or None if all of its buffers are full
+    def chooseBuffer(self, comp):
+        route = self.routes[comp.id]
+        if route.free == 0:
+            return None
+        return self.policy(route)
+
 #defines a component entity
 class Component():
+    __slots__ = ("id",)
     #creates the component
     def __init__(self, id):
-        self.id = id  
-        
+        self.id = id
+
 #defines a buffer entity
 class Buffer():
-    #creates the buffer with an attached inspector, component type, and workstation
-    def __init__(self, workstation, inspector, component):
+    __slots__ = ("workstation", "inspector", "component", "maxCapacity", "capacity", "timeOfLastCapacityChange", "totalCapacityMinutes",
+                 "route", "bit")
+    #creates the buffer with an attached inspector, component type, workstation, and the number of components it can hold
+    def __init__(self, workstation, inspector, component, maxCapacity = 2):
         self.workstation = workstation
         self.inspector = inspector
         self.component = component
+        self.maxCapacity = maxCapacity
         self.capacity = 0
         self.timeOfLastCapacityChange = 0
         self.totalCapacityMinutes = 0
-        
+        #the routing index of the inspector that holds this buffer, and the bit of this buffer in its bitmasks
+        self.route = None
+        self.bit = 0
+
 #defines a workstation entity
 class Workstation():
+    __slots__ = ("id", "busy", "busyUntil", "totalBusyTime", "productsCompleted", "buffers", "emptyBuffers", "assemblyTimes")
     #creates the workstation
     def __init__(self, id):
-        self.id = id  
+        self.id = id
         self.busy = False
+        self.busyUntil = 0
         self.totalBusyTime = 0
         self.productsCompleted = 0
+        self.buffers = []
+        #the number of attached buffers holding no components
+        self.emptyBuffers = 0
+        #the variate stream of assembly times
+        self.assemblyTimes = None
     #checks if the buffers attached to this workstation contain enough components to assemble a product
     def hasComponentsReady(self):
-        for b in self.getBuffers():
-            if b.capacity == 0:
-                return False
-        return True
+        return self.emptyBuffers == 0
     #returns all buffers attached to this workstation
     def getBuffers(self):
-        list = []
-        for b in BUFFERS:
-            if b.workstation == self:
-                list.append(b)
-        return list
+        return self.buffers
 
 #defines an event type for when an inspector puts a component in a buffer
 class BufferFillEvent():
+    __slots__ = ("time", "buffer")
     #creates the event
     def __init__(self, time, buffer):
-        self.buffer = buffer 
+        self.buffer = buffer
         self.time = time
     #returns a description of the event
     def desc(self):
         return "BFE | t: " + str(self.time) + " | I: " + str(self.buffer.inspector.id) + " | W: " + str(self.buffer.workstation.id)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.BFE, self.time, self.buffer.inspector.id, self.buffer.workstation.id, eventtrace.NO_ID)
     #executes the event
-    def execute(self):
-        global c1_in, c1_list
+    def execute(self, sim):
+        buffer = self.buffer
         #collect buffer occupancy statistics
-        self.buffer.totalCapacityMinutes += self.buffer.capacity * (self.time - self.buffer.timeOfLastCapacityChange)
-        self.buffer.capacity += 1
-        self.buffer.timeOfLastCapacityChange = self.time
+        buffer.totalCapacityMinutes += buffer.capacity * (self.time - buffer.timeOfLastCapacityChange)
+        if buffer.capacity == 0:
+            buffer.workstation.emptyBuffers -= 1
+        #move the buffer to its new level in the routing index, or out of it if it is now full
+        route = buffer.route
+        route.levels[buffer.capacity] ^= buffer.bit
+        buffer.capacity += 1
+        if buffer.capacity == buffer.maxCapacity:
+            route.free ^= buffer.bit
+        else:
+            route.levels[buffer.capacity] |= buffer.bit
+        buffer.timeOfLastCapacityChange = self.time
         #if the workstation attached to this buffer is now able to assemble a product, make it immediately start assembling a product
-        if self.buffer.workstation.hasComponentsReady() and self.buffer.workstation.busy == False:
-            addToFEL(BeginAssemblyEvent(self.time, self.buffer.workstation))
+        if buffer.workstation.hasComponentsReady() and buffer.workstation.busy == False:
+            sim.addToFEL(BeginAssemblyEvent(self.time, buffer.workstation))
+        #a component of an inspector that only inspects one component type enters the system when it is put in a buffer
+        if len(buffer.inspector.components) == 1:
+            sim.componentEntered(buffer.component, self.time)
         #make the inspector attached to this buffer immediately begin inspecting another component
-        if self.buffer.inspector == INSPECTORS[0]:
-            c1_in += 1
-            c1_list.append(self.time)
-            addToFEL(BeginInspectionEvent(self.time, self.buffer.inspector, COMPONENTS[0]))
-        else:
-            addToFEL(BeginInspectionEvent(self.time, self.buffer.inspector, getC2orC3(self.time)))
-                
+        sim.addToFEL(BeginInspectionEvent(self.time, buffer.inspector, sim.getNextComponent(buffer.inspector, self.time)))
+
 #defines an event type for when an inspector begins inspecting a component
 class BeginInspectionEvent():
+    __slots__ = ("time", "inspector", "component")
     #creates the event
     def __init__(self, time, inspector, component):
         self.inspector = inspector
         self.component = component
-        self.time = time     
+        self.time = time
     #returns a description of the event
     def desc(self):
         return "BIE | t: " + str(self.time) + " | I: " + str(self.inspector.id) + " | C: " + str(self.component.id)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.BIE, self.time, self.inspector.id, eventtrace.NO_ID, self.component.id)
     #executes the event
-    def execute(self):
+    def execute(self, sim):
         #generate an inspection time, and make this inspector finish inspecting this component after the inspection time
-        inspection_time = getInspectionTime(self.inspector, self.component)
-        addToFEL(FinishInspectionEvent(self.time + inspection_time, self.inspector, self.component))
-        
-#loop through which workstation gets C1
-next_workstation_C1 = 1
+        inspection_time = sim.getInspectionTime(self.inspector, self.component)
+        sim.addToFEL(FinishInspectionEvent(self.time + inspection_time, self.inspector, self.component))
 
 #defines an event type for when an inspector finishes inspecting a component
 class FinishInspectionEvent():
+    __slots__ = ("time", "inspector", "component")
     #creates the event
     def __init__(self, time, inspector, component):
         self.inspector = inspector
         self.component = component
-        self.time = time   
+        self.time = time
     #returns a description of the event
     def desc(self):
         return "FIE | t: " + str(self.time) + " | I: " + str(self.inspector.id) + " | C: " + str(self.component.id)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.FIE, self.time, self.inspector.id, eventtrace.NO_ID, self.component.id)
     #executes the event
-    def execute(self):
-        #find all buffers attached to this inspector with space for the component
-        freeBuffers = self.inspector.getFreeBuffers(self.component)
-        #if there is space, make the inspector put the component in one of the available buffers
-        if len(freeBuffers) > 0:
-            chosenBuffer = None
-
-            if self.inspector.id == 2:
-                for b in freeBuffers:
-                    if chosenBuffer == None or chosenBuffer.capacity > b.capacity:
-                        chosenBuffer = b
-
-            #alternate which workstation gets C1 instead of using priorities
-            global next_workstation_C1
-            if self.inspector.id == 1:
-                while chosenBuffer == None:
-                    for b in freeBuffers:
-                        if b.workstation.id == next_workstation_C1:
-                            if chosenBuffer == None or chosenBuffer.capacity > b.capacity:
-                                chosenBuffer = b
-                    if next_workstation_C1 == 3: next_workstation_C1 = 1
-                    else: next_workstation_C1 += 1                
-            addToFEL(BufferFillEvent(self.time, chosenBuffer))
+    def execute(self, sim):
+        #choose one of the buffers attached to this inspector with space for the component using the inspector's routing rule
+        chosenBuffer = self.inspector.chooseBuffer(self.component)
+        #if there is space, make the inspector put the component in the chosen buffer
+        if chosenBuffer != None:
+            sim.addToFEL(BufferFillEvent(self.time, chosenBuffer))
         #if there is no space, block the inspector
         else:
             self.inspector.waiting = self.component
             self.inspector.waitingSinceTime = self.time
-        
+
 #defines an event type for when a workstation begins assembling a product
 class BeginAssemblyEvent():
+    __slots__ = ("time", "workstation")
     #creates the event
     def __init__(self, time, workstation):
         self.workstation = workstation
@@ -195,217 +293,553 @@ class BeginAssemblyEvent():
     #returns a description of the event
     def desc(self):
         return "BAE | t: " + str(self.time) + " | W: " + str(self.workstation.id)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.BAE, self.time, eventtrace.NO_ID, self.workstation.id, eventtrace.NO_ID)
     #executes the event
-    def execute(self):
+    def execute(self, sim):
         #iterate through all buffers attached to the workstation
         for b in self.workstation.getBuffers():
             #collect buffer occupancy statistics and remove components from buffers
             b.totalCapacityMinutes += b.capacity * (self.time - b.timeOfLastCapacityChange)
+            route = b.route
+            if b.capacity == b.maxCapacity:
+                route.free |= b.bit
+            else:
+                route.levels[b.capacity] ^= b.bit
             b.capacity -= 1
-            b.timeOfLastCapacityChange = self.time  
+            route.levels[b.capacity] |= b.bit
+            if b.capacity == 0:
+                self.workstation.emptyBuffers += 1
+            b.timeOfLastCapacityChange = self.time
             #if the inspector attached to the buffer is blocked, unblock them and make them put a component in the buffer immediately
             if b.inspector.waiting == b.component:
                 b.inspector.waiting = False
                 b.inspector.totalWaitTime += self.time - b.inspector.waitingSinceTime
-                addToFEL(BufferFillEvent(self.time, b))
+                sim.addToFEL(BufferFillEvent(self.time, b))
         #make the workstation busy, generate an assembly time, and make the workstation finish assembling after the assembly time
-        self.workstation.busy = True
-        assembly_time = getAssemblyTime(self.workstation)
+        if self.workstation.busy == False:
+            self.workstation.busy = True
+            for b in self.workstation.buffers:
+                b.route.idle ^= b.bit
+        assembly_time = sim.getAssemblyTime(self.workstation)
         self.workstation.totalBusyTime += assembly_time
-        addToFEL(FinishAssemblyEvent(self.time + assembly_time, self.workstation))        
-        
+        self.workstation.busyUntil = self.time + assembly_time
+        sim.addToFEL(FinishAssemblyEvent(self.time + assembly_time, self.workstation))
+
 #defines an event type for when a workstation finishes assembling a product
 class FinishAssemblyEvent():
+    __slots__ = ("time", "workstation")
     #creates the event
     def __init__(self, time, workstation):
         self.workstation = workstation
         self.time = time
     #returns a description of the event
-    def desc(self):            
+    def desc(self):
         return "FAE | t: " + str(self.time) + " | W: " + str(self.workstation.id)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.FAE, self.time, eventtrace.NO_ID, self.workstation.id, eventtrace.NO_ID)
     #executes the event
-    def execute(self):
-        global c1_out, c2_out, c3_out, c1_list, c2_list, c3_list, c1_times, c2_times, c3_times
+    def execute(self, sim):
         #if the buffers attached to the workstation contain enough components to assemble another product, make the workstation begin assembling a product immediately
         if self.workstation.hasComponentsReady():
-            addToFEL(BeginAssemblyEvent(self.time, self.workstation))
+            sim.addToFEL(BeginAssemblyEvent(self.time, self.workstation))
         #if there are not enough components ready, make the workstation idle
         else:
             self.workstation.busy = False
-        #collect completed product statistics
+            for b in self.workstation.buffers:
+                b.route.idle |= b.bit
+        #collect completed product statistics, one component leaves the system from each buffer of the workstation
         self.workstation.productsCompleted += 1
-        if self.workstation.id == 1:
-            c1_out += 1
-            c1_times.append(self.time - c1_list.pop(0))
-        elif self.workstation.id == 2:
-            c1_out += 1
-            c1_times.append(self.time - c1_list.pop(0))
-            c2_out += 1
-            c2_times.append(self.time - c2_list.pop(0))
-        elif self.workstation.id == 3:
-            c1_out += 1
-            c1_times.append(self.time - c1_list.pop(0))
-            c3_out += 1
-            c3_times.append(self.time - c3_list.pop(0))
-            
+        for b in self.workstation.getBuffers():
+            sim.componentLeft(b.component, self.time)
+
 class MeasureEvent():
+    __slots__ = ("time",)
     #creates the event
     def __init__(self, time):
         self.time = time
     #returns a description of the event
-    def desc(self):            
+    def desc(self):
         return "ME | t: " + str(self.time)
+    #records the event in a binary trace
+    def trace(self, writer):
+        writer.record(eventtrace.ME, self.time, eventtrace.NO_ID, eventtrace.NO_ID, eventtrace.NO_ID)
     #executes the event
-    def execute(self):
-        global c1_list, c2_list, c3_list, c1_samples, c2_samples, c3_samples
-        #if the buffers attached to the workstation contain enough components to assemble another product, make the workstation begin assembling a product immediately
-        c1_samples.append(len(c1_list))
-        c2_samples.append(len(c2_list))
-        c3_samples.append(len(c3_list))
-            
-#adds an event to the approprite position in the FEL based on its occurrence time
-def addToFEL(event):
-    for i in range(len(FEL)):
-        if event.time < FEL[i].time:
-            FEL.insert(i, event)
+    def execute(self, sim):
+        #sample the number of each component currently in the system
+        for c in sim.components:
+            sim.samples[c.id].add(len(sim.inSystem[c.id]))
+        #schedule the next measurement, so only one MeasureEvent is ever in the FEL
+        if self.time + sim.config.measureInterval < sim.stopTime:
+            sim.addToFEL(MeasureEvent(self.time + sim.config.measureInterval))
+
+#holds the statistics collected by one run of the simulation
+class SimulationResults():
+    #creates the results from a finished simulation
+    def __init__(self, sim):
+        #the statistics cover the time since they were last reset
+        stop_time = sim.now - sim.statisticsStartTime
+        self.stopTime = sim.now
+        self.observedTime = stop_time
+        #little's law statistics for each component, keyed by component id
+        self.arrivalRate = {}
+        self.departureRate = {}
+        self.averageTimeInSystem = {}
+        self.averageNumberInSystem = {}
+        #the variance of the time in system, and the number in system sampled by the MeasureEvents, are kept for comparison
+        self.timeInSystemVariance = {}
+        self.sampledNumberInSystem = {}
+        for c in sim.components:
+            self.arrivalRate[c.id] = sim.arrivals[c.id] / stop_time
+            self.departureRate[c.id] = sim.departures[c.id] / stop_time
+            self.averageTimeInSystem[c.id] = sim.timesInSystem[c.id].getMean()
+            self.timeInSystemVariance[c.id] = sim.timesInSystem[c.id].getVariance()
+            self.averageNumberInSystem[c.id] = sim.numberInSystem[c.id].getMean(sim.now)
+            self.sampledNumberInSystem[c.id] = sim.samples[c.id].getMean()
+        #products completed by each workstation, keyed by workstation id
+        self.productsCompleted = {}
+        total_products = 0
+        for w in sim.workstations:
+            self.productsCompleted[w.id] = w.productsCompleted
+            total_products += w.productsCompleted
+        self.throughput = total_products / stop_time
+        #idle time percentage of each inspector, keyed by inspector id
+        self.inspectorIdle = {}
+        for i in sim.inspectors:
+            self.inspectorIdle[i.id] = 100 * i.totalWaitTime / stop_time
+        #average occupancy of each buffer, keyed by (inspector id, workstation id)
+        self.bufferOccupancy = {}
+        for b in sim.buffers:
+            self.bufferOccupancy[(b.inspector.id, b.workstation.id)] = b.totalCapacityMinutes / stop_time
+        #busy time percentage of each workstation, keyed by workstation id
+        self.workstationBusy = {}
+        for w in sim.workstations:
+            self.workstationBusy[w.id] = 100 * w.totalBusyTime / stop_time
+    #returns every metric as a flat dictionary of name to value, in the order they are printed
+    def metrics(self):
+        metrics = {}
+        for id in self.arrivalRate:
+            metrics["C" + str(id) + " arrival rate"] = self.arrivalRate[id]
+            metrics["C" + str(id) + " departure rate"] = self.departureRate[id]
+            metrics["C" + str(id) + " average time in system"] = self.averageTimeInSystem[id]
+            metrics["C" + str(id) + " average number in system"] = self.averageNumberInSystem[id]
+        for id in self.productsCompleted:
+            metrics["P" + str(id) + " finished"] = self.productsCompleted[id]
+        metrics["Throughput"] = self.throughput
+        for id in self.inspectorIdle:
+            metrics["Inspector " + str(id) + " idle %"] = self.inspectorIdle[id]
+        for (i, w) in self.bufferOccupancy:
+            metrics["Buffer " + str(i) + " " + str(w) + " occupancy"] = self.bufferOccupancy[(i, w)]
+        for id in self.workstationBusy:
+            metrics["Workstation " + str(id) + " busy %"] = self.workstationBusy[id]
+        return metrics
+    #prints the results in the same format as the original script
+    def report(self):
+        for id in self.arrivalRate:
+            print("COMPONENT " + str(id) + " ARRIVAL RATE:", self.arrivalRate[id])
+            print("COMPONENT " + str(id) + " DEPARTURE RATE:", self.departureRate[id])
+            print("COMPONENT " + str(id) + " AVERAGE TIME IN SYSTEM:", self.averageTimeInSystem[id])
+            print("COMPONENT " + str(id) + " AVERAGE NUMBER IN SYSTEM:", self.averageNumberInSystem[id])
+        for id in self.productsCompleted:
+            print("Total P", id, "Finished:", self.productsCompleted[id])
+        print("Total Throughput:", self.throughput, "products/min")
+        for id in self.inspectorIdle:
+            print("Inspector", id, "Idle Time:", self.inspectorIdle[id], "%")
+        for (i, w) in self.bufferOccupancy:
+            print("Buffer", i, w, "Average Occupancy:", self.bufferOccupancy[(i, w)])
+        for id in self.workstationBusy:
+            print("Workstation", id, "Busy Time:", self.workstationBusy[id], "%")
+    #writes the results to the output file in the same format as the original script
+    def write(self, output_file):
+        for id in self.productsCompleted:
+            output_file.write("Total P" + str(id) + " Finished: " + str(self.productsCompleted[id]) + "\n")
+        output_file.write("Total Throughput: " + str(self.throughput) + " products/min" + "\n")
+        for id in self.inspectorIdle:
+            output_file.write("Inspector " + str(id) + " Idle Time: " + str(self.inspectorIdle[id]) + " %" + "\n")
+        for (i, w) in self.bufferOccupancy:
+            output_file.write("Buffer " + str(i) + " " + str(w) + " Average Occupancy: " + str(self.bufferOccupancy[(i, w)]) + "\n")
+        for id in self.workstationBusy:
+            output_file.write("Workstation " + str(id) + " Busy Time: " + str(self.workstationBusy[id]) + " %" + "\n")
+
+#defines one replication of the simulation
+#all state lives on the object, so any number of simulations can be run in the same process
+class Simulation():
+    #creates the simulation from a config, a seed for the random number generators, and the replication number
+    #every replication of the same seed uses its own random number stream
+    #an antithetic simulation uses 1 - u for every uniform number u of its streams, so it is negatively correlated with the
+    #normal simulation of the same replication
+    def __init__(self, config, seed = 0, replication = 0, antithetic = False):
+        self.config = config
+        self.seed = seed
+        self.replication = replication
+        self.antithetic = antithetic
+        self.reset()
+
+    #puts the simulation back in its initial state, with an empty system at time 0
+    def reset(self):
+        topology = self.config.topology
+        #create the components, inspectors, workstations and buffers described by the topology
+        self.components = [Component(c) for c in topology.components]
+        components = dict((c.id, c) for c in self.components)
+        self.inspectors = []
+        for spec in topology.inspectors:
+            inspector = Inspector(spec["id"], spec["routing"])
+            for c in spec["components"]:
+                inspector.components.append(components[c])
+                inspector.routes[c] = RoutingIndex()
+            self.inspectors.append(inspector)
+        inspectors = dict((i.id, i) for i in self.inspectors)
+        self.workstations = [Workstation(w["id"]) for w in topology.workstations]
+        workstations = dict((w.id, w) for w in self.workstations)
+        #build the adjacency indexes once: the buffers of each inspector per component, and the buffers of each workstation
+        self.buffers = []
+        for spec in topology.buffers:
+            b = Buffer(workstations[spec["workstation"]], inspectors[spec["inspector"]], components[spec["component"]], spec["capacity"])
+            b.workstation.buffers.append(b)
+            b.workstation.emptyBuffers += 1
+            self.buffers.append(b)
+        self.buildRoutes(topology)
+        #create the FEL as a heap of (time, sequence number, event) entries
+        self.FEL = []
+        self.FEL_sequence = 0
+        #create counters to test for little's law, keyed by component id
+        #the entry times of the components in the system are a FIFO queue, and every other statistic is kept in constant memory
+        self.arrivals = {}
+        self.departures = {}
+        self.inSystem = {}
+        self.timesInSystem = {}
+        self.numberInSystem = {}
+        self.samples = {}
+        for c in self.components:
+            self.arrivals[c.id] = 0
+            self.departures[c.id] = 0
+            self.inSystem[c.id] = deque()
+            self.timesInSystem[c.id] = WelfordAccumulator()
+            self.numberInSystem[c.id] = TimeWeightedAccumulator()
+            self.samples[c.id] = WelfordAccumulator()
+        #initialize a separate random number substream for each entity from the seed and replication number
+        #each substream generates its variates in blocks, already transformed to inspection times, assembly times, or component choices
+        #in the trace input mode the inspection and assembly times are replayed from the data files instead
+        self.streams = RandomStreams(self.seed, self.replication)
+        names = topology.streamNames()
+        generators = {}
+        for index in range(len(names)):
+            generators[names[index]] = self.streams.getStream(index)
+        self.variates = {}
+        for (inspector, spec) in zip(self.inspectors, topology.inspectors):
+            for c in spec["components"]:
+                name = Topology.inspectionStreamName(inspector.id, c)
+                self.variates[name] = timeStream(self.config.inputMode, generators[name], self.config.lambdas[name], self.config.times.get(name), self.antithetic)
+                inspector.inspectionTimes[c] = self.variates[name]
+            if len(spec["components"]) > 1:
+                name = Topology.choiceStreamName(spec)
+                self.variates[name] = VariateStream(generators[name], choiceTransform(spec["weights"]), antithetic = self.antithetic)
+                inspector.componentChoice = self.variates[name]
+        for workstation in self.workstations:
+            name = Topology.assemblyStreamName(workstation.id)
+            self.variates[name] = timeStream(self.config.inputMode, generators[name], self.config.lambdas[name], self.config.times.get(name), self.antithetic)
+            workstation.assemblyTimes = self.variates[name]
+        self.stopTime = 0
+        self.now = 0
+        self.eventsExecuted = 0
+        self.statisticsStartTime = 0
+        self.trace = None
+        self.instruments = None
+
+    #adds an event to the FEL heap, ordered by occurrence time
+    #the sequence number breaks ties so simultaneous events are executed in the order they were added
+    def addToFEL(self, event):
+        heapq.heappush(self.FEL, (event.time, self.FEL_sequence, event))
+        self.FEL_sequence += 1
+
+    #removes and returns the next event from the FEL
+    def popFromFEL(self):
+        return heapq.heappop(self.FEL)[2]
+
+    #records that a component entered the system at the given time
+    def componentEntered(self, component, time):
+        self.arrivals[component.id] += 1
+        self.inSystem[component.id].append(time)
+        self.numberInSystem[component.id].change(time, 1)
+
+    #records that a component left the system at the given time
+    def componentLeft(self, component, time):
+        self.departures[component.id] += 1
+        self.timesInSystem[component.id].add(time - self.inSystem[component.id].popleft())
+        self.numberInSystem[component.id].change(time, -1)
+
+    #returns the component the inspector inspects next
+    #an inspector of several component types chooses one at random using its weights, and the chosen component enters the system
+    def getNextComponent(self, inspector, time):
+        if inspector.componentChoice == None:
+            return inspector.components[0]
+        component = inspector.components[inspector.componentChoice.next()]
+        self.componentEntered(component, time)
+        return component
+
+    #retreives the next inspection time of the correct inspector and component, from the fitted exponential distribution,
+    #the empirical distribution of its data file, or the data file itself, depending on the input mode
+    def getInspectionTime(self, inspector, component):
+        return inspector.inspectionTimes[component.id].next()
+
+    #retreives the next assembly time of the correct workstation, in the same way as the inspection times
+    def getAssemblyTime(self, workstation):
+        return workstation.assemblyTimes.next()
+
+    #starts the simulation from an empty system at time 0; events after the stop time are never executed
+    #if a trace writer is given, every event is recorded in it
+    #if instruments are given (see instruments.py), the event loop records them as it runs
+    def start(self, stop_time = float("inf"), trace = None, instruments = None):
+        self.reset()
+        self.stopTime = stop_time
+        self.trace = trace
+        self.instruments = instruments
+        if instruments != None:
+            instruments.attach(self)
+        #Initialize the simulation by creating a BeginInspection event at time 0 for each inspector
+        #Each inspector should immediately begin inspecting a component when the simulation begins
+        for inspector in self.inspectors:
+            self.addToFEL(BeginInspectionEvent(0, inspector, self.getNextComponent(inspector, 0)))
+        #schedule the first measurement; each MeasureEvent schedules the one after it
+        if stop_time > 0:
+            self.addToFEL(MeasureEvent(0))
+
+    #executes every event up to the given time, or up to the stop time if it comes first
+    def advance(self, until):
+        until = min(until, self.stopTime)
+        if self.instruments != None:
+            self.eventsExecuted += self.instruments.advance(self, until)
+            self.now = until
             return
-    FEL.append(event)
-    
-#returns either the component C2 or C3 with an equal probability
-def getC2orC3(time):
-    global c2_in, c3_in, c2_list, c3_list
-    component = COMPONENTS[random.randint(1,2)]
-    if component == COMPONENTS[1]:
-        c2_in += 1
-        c2_list.append(time)
-    else:
-        c3_in += 1
-        c3_list.append(time)
-    return component
-
-#retreives random inspection times sequentially from the correct file
-def getInspectionTime(inspector, component):
-    if inspector.id == 1:
-        return getExponential(I1C1_lambda)
-    elif component == COMPONENTS[1]:
-        return getExponential(I2C2_lambda)
-    else:
-        return getExponential(I2C3_lambda)
-            
-#retreives random assembly times sequentially from the correct file
-def getAssemblyTime(workstation):
-    if workstation.id == 1:
-        return getExponential(W1_lambda)
-    elif workstation.id == 2:
-        return getExponential(W2_lambda)
+        FEL = self.FEL
+        trace = self.trace
+        executed = 0
+        #run the simulation until the FEL is empty or the next event is after the given time
+        while len(FEL) > 0 and FEL[0][0] <= until:
+            #take the next event from the FEL
+            event = self.popFromFEL()
+            #record the event in the trace
+            if trace != None:
+                event.trace(trace)
+            #execute the event
+            event.execute(self)
+            executed += 1
+        self.eventsExecuted += executed
+        self.now = until
+
+    #discards the statistics collected so far, so the results only cover the time from now on
+    #the state of the system is kept; this is used to delete the warm-up period
+    def resetStatistics(self):
+        time = self.now
+        self.statisticsStartTime = time
+        for c in self.components:
+            self.arrivals[c.id] = 0
+            self.departures[c.id] = 0
+            self.timesInSystem[c.id] = WelfordAccumulator()
+            self.numberInSystem[c.id] = TimeWeightedAccumulator(len(self.inSystem[c.id]), time)
+            self.samples[c.id] = WelfordAccumulator()
+        for b in self.buffers:
+            b.totalCapacityMinutes = 0
+            b.timeOfLastCapacityChange = time
+        for i in self.inspectors:
+            i.totalWaitTime = 0
+            if i.waiting != False:
+                i.waitingSinceTime = time
+        for w in self.workstations:
+            w.productsCompleted = 0
+            #the busy time of an assembly is counted when it begins, so only keep the part of the current assembly still to come
+            w.totalBusyTime = w.busyUntil - time if w.busy else 0
+
+    #returns the results of the statistics collected so far
+    def getResults(self):
+        return SimulationResults(self)
+
+    #returns a snapshot of the full state of the simulation: the FEL, the entities, the statistics and the random number streams
+    #the trace writer and instruments are not part of the snapshot, and the config is only stored as its hash
+    def snapshot(self):
+        (trace, instruments) = (self.trace, self.instruments)
+        self.trace = None
+        self.instruments = None
+        try:
+            data = io.BytesIO()
+            SnapshotPickler(data, self.config).dump((configKey(self.config), self))
+        finally:
+            (self.trace, self.instruments) = (trace, instruments)
+        return data.getvalue()
+
+    #returns the simulation stored in a snapshot, which continues exactly where the snapshotted simulation was
+    #the config must be the one the snapshot was taken with, unless check is False, in which case the config may change the
+    #routing rules and buffer capacities (see applyTopology), e.g. to branch policy variants off a warmed-up system
+    @staticmethod
+    def restore(config, data, check = True):
+        (key, sim) = SnapshotUnpickler(io.BytesIO(data), config).load()
+        if key != configKey(config):
+            if check:
+                raise ValueError("the snapshot was taken with a different config")
+            sim.applyTopology(config.topology)
+        return sim
+
+    #writes a snapshot of the simulation to a file
+    def saveSnapshot(self, filename):
+        with open(filename, "wb") as f:
+            f.write(self.snapshot())
+
+    #returns the simulation stored in a snapshot file
+    @staticmethod
+    def loadSnapshot(config, filename, check = True):
+        with open(filename, "rb") as f:
+            return Simulation.restore(config, f.read(), check)
+
+    #moves every random number stream to the start of the streams of another seed and replication, discarding the variates
+    #already generated, so several replications can be branched off the same snapshot
+    #the streams of an instrumented run are reseeded inside their counting streams, and the streams of recorded times replayed
+    #in the trace input mode move to the starting position of the new replication; any other stream raises a ValueError,
+    #since its branches would not be independent
+    def reseed(self, seed, replication):
+        self.seed = seed
+        self.replication = replication
+        self.streams = RandomStreams(seed, replication)
+        names = self.config.topology.streamNames()
+        for index in range(len(names)):
+            stream = self.variates[names[index]]
+            while not isinstance(stream, (VariateStream, TraceStream)) and hasattr(stream, "stream"):
+                stream = stream.stream
+            if isinstance(stream, VariateStream):
+                stream.generator = self.streams.getStream(index)
+                stream.values = iter(())
+            elif isinstance(stream, TraceStream):
+                stream.seek(self.streams.getStream(index))
+            else:
+                raise ValueError("cannot reseed the stream " + names[index] + " of type " + type(stream).__name__)
+
+    #changes the routing rules and buffer capacities of the simulation to those of the topology, which must otherwise have
+    #the same inspectors, workstations and buffers
+    #an inspector blocked on a component that now has space puts it in a buffer immediately
+    def applyTopology(self, topology):
+        if [(b["inspector"], b["workstation"], b["component"]) for b in topology.buffers] != [(b.inspector.id, b.workstation.id, b.component.id) for b in self.buffers]:
+            raise ValueError("the topology does not have the same buffers as the simulation")
+        if [i["id"] for i in topology.inspectors] != [i.id for i in self.inspectors]:
+            raise ValueError("the topology does not have the same inspectors as the simulation")
+        for (b, spec) in zip(self.buffers, topology.buffers):
+            if b.capacity > spec["capacity"]:
+                raise ValueError("buffer " + str(b.inspector.id) + " " + str(b.workstation.id) + " holds more components than its new capacity")
+            b.maxCapacity = spec["capacity"]
+        for (inspector, spec) in zip(self.inspectors, topology.inspectors):
+            inspector.routing = spec["routing"]
+            inspector.policy = ROUTING_POLICIES[spec["routing"]]
+        self.buildRoutes(topology)
+        for inspector in self.inspectors:
+            if inspector.waiting != False:
+                chosenBuffer = inspector.chooseBuffer(inspector.waiting)
+                if chosenBuffer != None:
+                    inspector.waiting = False
+                    inspector.totalWaitTime += self.now - inspector.waitingSinceTime
+                    self.addToFEL(BufferFillEvent(self.now, chosenBuffer))
+        self.config = self.config.withTopology(topology)
+
+    #builds the routing index of every inspector and component from the routing order of the topology and the current state
+    def buildRoutes(self, topology):
+        for (inspector, spec) in zip(self.inspectors, topology.inspectors):
+            order = topology.routingOrder(spec)
+            for k in range(len(inspector.components)):
+                inspector.routes[inspector.components[k].id].build([self.buffers[b] for b in order[k]])
+
+    #moves the stop time to a later time, so a run that reached its stop time, e.g. a restored snapshot, can go on
+    #the MeasureEvents stopped at the old stop time, so the next one is scheduled again
+    def extend(self, stop_time):
+        if stop_time <= self.stopTime:
+            return
+        interval = self.config.measureInterval
+        measuring = any(type(entry[2]) == MeasureEvent for entry in self.FEL)
+        next_measurement = math.ceil(self.stopTime / interval) * interval
+        self.stopTime = stop_time
+        if not measuring and next_measurement < stop_time:
+            self.addToFEL(MeasureEvent(next_measurement))
+
+    #runs the simulation from an empty system until the stop time and returns its results
+    #if a trace writer is given, every event is recorded in it
+    def run(self, stop_time, trace = None, instruments = None):
+        self.start(stop_time, trace, instruments)
+        self.advance(stop_time)
+        return self.getResults()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run the simulation")
+    parser.add_argument("topology", nargs = "?", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("--trace", choices = eventtrace.TRACE_LEVELS, default = eventtrace.TRACE_FULL,
+                        help = "off: only print the statistics, summary: also write them to the output file, full: also record every event in a binary trace")
+    parser.add_argument("-t", "--stop-time", type = int, default = None, help = "minutes to run the simulation for (asked for if not given)")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the random number streams")
+    parser.add_argument("--input", choices = INPUT_MODES, default = INPUT_EXPONENTIAL,
+                        help = "exponential: sample the fitted distributions, empirical: sample the recorded times, trace: replay the recorded times in order")
+    parser.add_argument("-o", "--output", default = "output/simulation_output.txt", help = "file the statistics are written to")
+    parser.add_argument("--trace-folder", default = "output/simulation_trace", help = "folder the binary event trace is written to")
+    parser.add_argument("--checkpoint", default = None, help = "file a snapshot of the simulation is saved to every checkpoint interval")
+    parser.add_argument("--checkpoint-interval", type = float, default = 100000, help = "simulated minutes between checkpoints")
+    parser.add_argument("--resume", default = None, help = "snapshot file to continue from instead of starting from an empty system")
+    parser.add_argument("--metrics-file", default = None, help = "JSONL file the metrics of every window of simulated time are appended to while the simulation runs")
+    parser.add_argument("--metrics-interval", type = float, default = 10000, help = "simulated minutes in each window of the metrics file")
+    args = parser.parse_args()
+
+    #load the plant topology and the input model once from the data files
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology), args.input)
+
+    #get the user to enter a number of minutes that the simulation will run for, unless it was given on the command line
+    if args.stop_time != None:
+        STOP_TIME = args.stop_time
     else:
-        return getExponential(W3_lambda)
-        
-#create the FEL
-FEL = []
-
-#create the inspectors, components, buffers, and workstations
-INSPECTORS = [Inspector(1), Inspector(2)]
-COMPONENTS = [Component(1), Component(2), Component(3)]
-WORKSTATIONS = [Workstation(1), Workstation(2), Workstation(3)]
-BUFFERS = [Buffer(WORKSTATIONS[0],INSPECTORS[0],COMPONENTS[0]), 
-           Buffer(WORKSTATIONS[1],INSPECTORS[0],COMPONENTS[0]), 
-           Buffer(WORKSTATIONS[1],INSPECTORS[1],COMPONENTS[1]), 
-           Buffer(WORKSTATIONS[2],INSPECTORS[0],COMPONENTS[0]), 
-           Buffer(WORKSTATIONS[2],INSPECTORS[1],COMPONENTS[2])]
+        STOP_TIME = int(input("Enter the number of minutes to run the simulation: "))
 
-#define the folder where inspection time and assembly time files are located
-DATA_FOLDER = "data/"
+    #open the binary trace; it can be converted to the text format with eventtrace.py
+    OUTPUT_FILENAME = args.output
+    TRACE_FOLDER = args.trace_folder
+    trace = None
+    if args.trace == eventtrace.TRACE_FULL:
+        trace = eventtrace.TraceWriter(TRACE_FOLDER)
+
+    #run the simulation, or continue a snapshot of an earlier run; the trace of a continued run starts where it was continued
+    if args.resume != None:
+        sim = Simulation.loadSnapshot(config, args.resume)
+        sim.extend(STOP_TIME)
+        sim.trace = trace
+    else:
+        sim = Simulation(config, args.seed)
+        sim.start(STOP_TIME, trace)
+    #save a snapshot every checkpoint interval and at the stop time, replacing the previous one only once the new one is complete,
+    #and export the metrics of every window of the metrics interval
+    exporter = WindowExporter(sim, args.metrics_file, args.metrics_interval) if args.metrics_file != None else None
+    next_checkpoint = sim.now + args.checkpoint_interval if args.checkpoint != None else float("inf")
+    next_window = sim.now + args.metrics_interval if exporter != None else float("inf")
+    try:
+        while sim.now < STOP_TIME:
+            sim.advance(min(next_checkpoint, next_window, STOP_TIME))
+            if sim.now >= next_window or (exporter != None and sim.now >= STOP_TIME):
+                exporter.record(sim)
+                next_window += args.metrics_interval
+            if sim.now >= next_checkpoint or (args.checkpoint != None and sim.now >= STOP_TIME):
+                sim.saveSnapshot(args.checkpoint + ".tmp")
+                os.replace(args.checkpoint + ".tmp", args.checkpoint)
+                next_checkpoint += args.checkpoint_interval
+    finally:
+        if exporter != None:
+            exporter.close()
+    results = sim.getResults()
+    if trace != None:
+        trace.close()
 
-#load the inspection and assembly times from the files in the DATA_FOLDER
-I1C1_times = np.loadtxt(DATA_FOLDER + 'servinsp1.dat', unpack = True)
-I2C2_times = np.loadtxt(DATA_FOLDER + 'servinsp22.dat', unpack = True)
-I2C3_times = np.loadtxt(DATA_FOLDER + 'servinsp23.dat', unpack = True)
-W1_times = np.loadtxt(DATA_FOLDER + 'ws1.dat', unpack = True)
-W2_times = np.loadtxt(DATA_FOLDER + 'ws2.dat', unpack = True)
-W3_times = np.loadtxt(DATA_FOLDER + 'ws3.dat', unpack = True)
-I1C1_lambda = lam_estimator(I1C1_times)
-I2C2_lambda = lam_estimator(I2C2_times)
-I2C3_lambda = lam_estimator(I2C3_times)
-W1_lambda = lam_estimator(W1_times)
-W2_lambda = lam_estimator(W2_times)
-W3_lambda = lam_estimator(W3_times)
-
-#initialize the linear congruential generator
-lin_con_gen = LinearCongruentialGenerator(289, 321, 65536, 0)
-
-#get the user to enter a number of minutes that the simulation will run for
-STOP_TIME = int(input("Enter the number of minutes to run the simulation: "))
-
-#open the output file
-OUTPUT_FILENAME = "output/simulation_output.txt"
-output_file = open(OUTPUT_FILENAME, "w")
-
-#Initialize the simulation by creating 2 BeginInspection events at time 0
-#Each inspector should immediately begin inspecting a component when the simulation begins
-FEL.append(BeginInspectionEvent(0, INSPECTORS[0], COMPONENTS[0]))
-FEL.append(BeginInspectionEvent(0, INSPECTORS[1], getC2orC3(0)))
-
-i = 0
-while i < STOP_TIME:
-    FEL.append(MeasureEvent(i))
-    i += 10
-
-#run the simulation until the FEL is empty or the STOP_TIME is reached
-while len(FEL) > 0:
-    #take the next event from the FEL
-    event = FEL.pop(0)
-    if event.time > STOP_TIME:
-        break
-    #record the event in the output file
-    output_file.write(event.desc() + "\n")
-    #execute the event
-    event.execute()
-    
-#tell the user that the simulation has finished
-output_file.write("SIMULATION FINISHED AT TIME " + str(STOP_TIME) + "\n")
-print("SIMULATION FINISHED AT TIME", STOP_TIME)
-print("SIMULATION OUTPUT STORED IN FILE \"", OUTPUT_FILENAME, "\"")
-
-print("COMPONENT 1 ARRIVAL RATE:", c1_in / STOP_TIME)
-print("COMPONENT 1 DEPARTURE RATE:", c1_out / STOP_TIME)
-print("COMPONENT 1 AVERAGE TIME IN SYSTEM:", sum(c1_times) / len(c1_times))
-print("COMPONENT 1 AVERAGE NUMBER IN SYSTEM:", sum(c1_samples) / len(c1_samples))
-print("COMPONENT 2 ARRIVAL RATE:", c2_in / STOP_TIME)
-print("COMPONENT 2 DEPARTURE RATE:", c2_out / STOP_TIME)
-print("COMPONENT 2 AVERAGE TIME IN SYSTEM:", sum(c2_times) / len(c2_times))
-print("COMPONENT 2 AVERAGE NUMBER IN SYSTEM:", sum(c2_samples) / len(c2_samples))
-print("COMPONENT 3 ARRIVAL RATE:", c3_in / STOP_TIME)
-print("COMPONENT 3 DEPARTURE RATE:", c3_out / STOP_TIME)
-print("COMPONENT 3 AVERAGE TIME IN SYSTEM:", sum(c3_times) / len(c3_times))
-print("COMPONENT 3 AVERAGE NUMBER IN SYSTEM:", sum(c3_samples) / len(c3_samples))
-
-#collect the number of products completed by each workstation
-total_products = 0
-for w in WORKSTATIONS:
-    output_file.write("Total P" + str(w.id) + " Finished: " + str(w.productsCompleted) + "\n")  
-    print("Total P", w.id, "Finished:", w.productsCompleted)
-    total_products += w.productsCompleted
-
-#collect total throughput statistics
-output_file.write("Total Throughput: " + str(total_products / STOP_TIME) + " products/min" + "\n")
-print("Total Throughput:", total_products / STOP_TIME, "products/min")
-
-#collect idle time statistics for each inspector
-for i in INSPECTORS:
-    output_file.write("Inspector " + str(i.id) + " Idle Time: " + str(100 * i.totalWaitTime / STOP_TIME) + " %" + "\n")
-    print("Inspector", i.id, "Idle Time:", 100 * i.totalWaitTime / STOP_TIME, "%")
-    
-#collect average occupancy statistics for each buffer
-for b in BUFFERS:
-    output_file.write("Buffer " + str(b.inspector.id) + " " + str(b.workstation.id) + " Average Occupancy: " + str(b.totalCapacityMinutes / STOP_TIME) + "\n") 
-    print("Buffer", b.inspector.id, b.workstation.id, "Average Occupancy:", b.totalCapacityMinutes / STOP_TIME)    
-    
-#collect busy time statistics for each workstation
-for w in WORKSTATIONS:
-    output_file.write("Workstation " + str(w.id) + " Busy Time: " + str(100 * w.totalBusyTime / STOP_TIME) + " %" + "\n")
-    print("Workstation", w.id, "Busy Time:", 100 * w.totalBusyTime / STOP_TIME, "%") 
-    
-#close the output file
-output_file.close()
+    #tell the user that the simulation has finished
+    print("SIMULATION FINISHED AT TIME", STOP_TIME)
+    if args.trace != eventtrace.TRACE_OFF:
+        print("SIMULATION OUTPUT STORED IN FILE \"", OUTPUT_FILENAME, "\"")
+    if trace != None:
+        print("EVENT TRACE STORED IN FOLDER \"", TRACE_FOLDER, "\"")
 
+    #print and record the collected statistics
+    results.report()
+    if args.trace != eventtrace.TRACE_OFF:
+        output_file = open(OUTPUT_FILENAME, "w")
+        output_file.write("SIMULATION FINISHED AT TIME " + str(STOP_TIME) + "\n")
+        results.write(output_file)
+        output_file.close()
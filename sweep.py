@@ -0,0 +1,156 @@
+import argparse
+import copy
+import csv
+import itertools
+import json
+import multiprocessing
+
+from sim import Config, Simulation, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from inputs import INPUT_EXPONENTIAL
+from replicate import confidenceInterval
+from cache import ResultCache, resultKey, cachedRun
+
+#the config of the base topology, loaded once in each worker process
+#every scenario shares its input model, so only the topology changes between scenarios
+worker_config = None
+#the configs of the scenarios already seen by this worker, keyed by scenario number
+worker_scenarios = {}
+
+#loads the input model of the base topology in the worker process
+def initWorker(topology_file, input_mode):
+    global worker_config
+    worker_config = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file), input_mode)
+
+#returns every combination of the factor levels of the grid, as a list of dictionaries of factor name to level
+#the factors are:
+#  "capacity": the capacity of every buffer
+#  "capacity I W": the capacity of the buffer between inspector I and workstation W
+#  "routing I": the routing rule of inspector I
+#  "priority I": the workstations inspector I prefers, in order, which the routing rules use to break ties
+#  "stopTime": the number of minutes each replication runs for
+def expandGrid(factors):
+    names = list(factors)
+    scenarios = []
+    for levels in itertools.product(*[factors[name] for name in names]):
+        scenarios.append(dict(zip(names, levels)))
+    return scenarios
+
+#returns the topology of the base topology with the levels of the scenario applied
+def applyScenario(base, scenario):
+    spec = copy.deepcopy(base.toDict())
+    for name in scenario:
+        words = name.split()
+        if words[0] == "capacity" and len(words) == 1:
+            for b in spec["buffers"]:
+                b["capacity"] = int(scenario[name])
+        elif words[0] == "capacity":
+            matches = [b for b in spec["buffers"] if b["inspector"] == int(words[1]) and b["workstation"] == int(words[2])]
+            if len(matches) == 0:
+                raise ValueError("no buffer between inspector " + words[1] + " and workstation " + words[2])
+            matches[0]["capacity"] = int(scenario[name])
+        elif words[0] == "routing":
+            matches = [i for i in spec["inspectors"] if i["id"] == int(words[1])]
+            if len(matches) == 0:
+                raise ValueError("no inspector " + words[1])
+            matches[0]["routing"] = scenario[name]
+        elif words[0] == "priority":
+            matches = [i for i in spec["inspectors"] if i["id"] == int(words[1])]
+            if len(matches) == 0:
+                raise ValueError("no inspector " + words[1])
+            matches[0]["priority"] = [int(w) for w in scenario[name]]
+        elif name != "stopTime":
+            raise ValueError("unknown factor " + name)
+    return Topology(spec)
+
+#runs one replication of one scenario and returns its metrics
+def runJob(job):
+    (index, scenario, replication, seed, stop_time) = job
+    if index not in worker_scenarios:
+        worker_scenarios[index] = worker_config.withTopology(applyScenario(worker_config.topology, scenario))
+    return Simulation(worker_scenarios[index], seed, replication).run(stop_time).metrics()
+
+#runs the given jobs across a pool of worker processes
+def runJobs(topology_file, input_mode, jobs, workers = None):
+    with multiprocessing.Pool(workers, initializer = initWorker, initargs = (topology_file, input_mode)) as pool:
+        return pool.map(runJob, jobs, chunksize = max(1, len(jobs) // (4 * (workers or multiprocessing.cpu_count()))))
+
+#runs every replication of every scenario of the grid across a pool of worker processes and returns the rows of the results table
+#replication r of every scenario uses random number stream r, so scenarios are compared on the same random numbers
+#if a result cache is given, replications already in it are not run again
+def runSweep(grid, workers = None, cache = None):
+    topology_file = grid.get("topology", DEFAULT_TOPOLOGY)
+    seed = grid.get("seed", 0)
+    replications = grid.get("replications", 10)
+    default_stop_time = grid.get("stopTime", 10000)
+    input_mode = grid.get("input", INPUT_EXPONENTIAL)
+    scenarios = expandGrid(grid["factors"])
+    #check every scenario before starting any replication
+    base = Config.fromDataFolder(DATA_FOLDER, Topology.load(topology_file), input_mode)
+    configs = [base.withTopology(applyScenario(base.topology, scenario)) for scenario in scenarios]
+    jobs = []
+    for index in range(len(scenarios)):
+        stop_time = scenarios[index].get("stopTime", default_stop_time)
+        for replication in range(replications):
+            key = resultKey(configs[index], seed, replication, stop_time)
+            jobs.append((key, (index, scenarios[index], replication, seed, stop_time)))
+    metrics = cachedRun(cache, jobs, lambda missing: runJobs(topology_file, input_mode, missing, workers))
+    rows = []
+    for ((key, (index, scenario, replication, seed, stop_time)), m) in zip(jobs, metrics):
+        row = {"scenario": index}
+        row.update(scenario)
+        row["replication"] = replication
+        row.update(m)
+        rows.append(row)
+    return rows
+
+#returns one row per scenario with the mean and confidence interval half-width of every metric
+def summarize(rows, factor_names, confidence = 0.95):
+    by_scenario = {}
+    for row in rows:
+        by_scenario.setdefault(row["scenario"], []).append(row)
+    summary = []
+    for index in sorted(by_scenario):
+        group = by_scenario[index]
+        row = {"scenario": index}
+        for name in factor_names:
+            row[name] = group[0][name]
+        row["replications"] = len(group)
+        for name in group[0]:
+            if name in row or name == "replication":
+                continue
+            (mean, variance, half_width) = confidenceInterval([r[name] for r in group], confidence)
+            row[name + " mean"] = mean
+            row[name + " half-width"] = half_width
+        summary.append(row)
+    return summary
+
+#writes a list of rows with the same keys to a csv file
+def writeTable(rows, filename):
+    with open(filename, "w", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run every scenario of a grid of buffer capacities, routing rules and run lengths")
+    parser.add_argument("grid", help = "json file describing the grid, see config/sweep_example.json")
+    parser.add_argument("-o", "--output", default = "output/sweep_results.csv", help = "csv file with one row per replication of each scenario")
+    parser.add_argument("--summary", default = None, help = "csv file with the mean and half-width of every metric of each scenario")
+    parser.add_argument("-w", "--workers", type = int, default = None, help = "number of worker processes (default: all cores)")
+    parser.add_argument("--cache", default = None, help = "result cache file; replications already in it are not run again")
+    args = parser.parse_args()
+
+    with open(args.grid) as f:
+        grid = json.load(f)
+    cache = ResultCache(args.cache) if args.cache != None else None
+    rows = runSweep(grid, args.workers, cache)
+    if cache != None:
+        print("CACHE:", cache.hits, "hits,", cache.misses, "misses")
+        cache.close()
+    writeTable(rows, args.output)
+    print("SWEEP FINISHED:", len(rows), "replications of", len(expandGrid(grid["factors"])), "scenarios")
+    print("RESULTS STORED IN FILE \"", args.output, "\"")
+    if args.summary != None:
+        writeTable(summarize(rows, list(grid["factors"])), args.summary)
+        print("SUMMARY STORED IN FILE \"", args.summary, "\"")
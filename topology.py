@@ -0,0 +1,150 @@
+import json
+
+from routing import SHORTEST_QUEUE, ROUTING_POLICIES
+
+#define the file describing the default plant: 2 inspectors, 3 components, 3 workstations and 5 buffers of capacity 2
+DEFAULT_TOPOLOGY = "config/default_plant.json"
+
+#defines the layout of the plant: which inspectors inspect which components, and which buffers connect them to workstations
+#a topology is plain data; the simulation builds its entities and indexes from it once
+class Topology():
+    #creates the topology from a dictionary with the same structure as the json files in the config folder
+    def __init__(self, spec):
+        self.components = [int(c) for c in spec["components"]]
+        self.inspectors = []
+        for i in spec["inspectors"]:
+            components = [int(c) for c in i["components"]]
+            weights = i.get("weights")
+            if weights == None:
+                weights = [1 / len(components)] * len(components)
+            else:
+                weights = [float(weights[str(c)]) for c in components]
+            #the workstations the inspector prefers, in order; buffers to other workstations follow in the order of the topology
+            priority = i.get("priority")
+            if priority != None:
+                priority = [int(w) for w in priority]
+            self.inspectors.append({"id": int(i["id"]),
+                                    "components": components,
+                                    "data": [i["components"][str(c)] for c in components],
+                                    "weights": weights,
+                                    "routing": i.get("routing", SHORTEST_QUEUE),
+                                    "priority": priority})
+        self.workstations = []
+        for w in spec["workstations"]:
+            self.workstations.append({"id": int(w["id"]), "data": w["data"]})
+        self.buffers = []
+        for b in spec["buffers"]:
+            self.buffers.append({"inspector": int(b["inspector"]),
+                                 "workstation": int(b["workstation"]),
+                                 "component": int(b["component"]),
+                                 "capacity": int(b.get("capacity", 2))})
+        self.validate()
+
+    #loads the topology from a json file
+    @staticmethod
+    def load(filename = DEFAULT_TOPOLOGY):
+        with open(filename) as f:
+            return Topology(json.load(f))
+
+    #checks that every entity referenced by the topology exists, raising a ValueError if it does not
+    def validate(self):
+        inspector_components = {}
+        for i in self.inspectors:
+            for c in i["components"]:
+                if c not in self.components:
+                    raise ValueError("inspector " + str(i["id"]) + " inspects unknown component " + str(c))
+            if i["routing"] not in ROUTING_POLICIES:
+                raise ValueError("inspector " + str(i["id"]) + " has unknown routing rule " + str(i["routing"]))
+            if abs(sum(i["weights"]) - 1) > 1e-9:
+                raise ValueError("component weights of inspector " + str(i["id"]) + " do not sum to 1")
+            inspector_components[i["id"]] = i["components"]
+        workstation_ids = [w["id"] for w in self.workstations]
+        pairs = set()
+        for b in self.buffers:
+            if b["inspector"] not in inspector_components:
+                raise ValueError("buffer refers to unknown inspector " + str(b["inspector"]))
+            if b["workstation"] not in workstation_ids:
+                raise ValueError("buffer refers to unknown workstation " + str(b["workstation"]))
+            if b["component"] not in inspector_components[b["inspector"]]:
+                raise ValueError("inspector " + str(b["inspector"]) + " does not inspect component " + str(b["component"]))
+            if b["capacity"] < 1:
+                raise ValueError("buffer capacity must be at least 1")
+            if (b["inspector"], b["workstation"]) in pairs:
+                raise ValueError("more than one buffer between inspector " + str(b["inspector"]) + " and workstation " + str(b["workstation"]))
+            pairs.add((b["inspector"], b["workstation"]))
+        for w in workstation_ids:
+            if w not in [b["workstation"] for b in self.buffers]:
+                raise ValueError("workstation " + str(w) + " has no buffers")
+        for i in self.inspectors:
+            if i["priority"] != None:
+                for w in i["priority"]:
+                    if w not in workstation_ids:
+                        raise ValueError("priority of inspector " + str(i["id"]) + " refers to unknown workstation " + str(w))
+                if len(set(i["priority"])) != len(i["priority"]):
+                    raise ValueError("priority of inspector " + str(i["id"]) + " lists a workstation more than once")
+
+    #returns the positions in the buffer list of the buffers of the inspector for each of its components, in routing order:
+    #the order of the inspector's priority, then the order of the topology
+    def routingOrder(self, inspector):
+        priority = inspector["priority"] or []
+        order = []
+        for c in inspector["components"]:
+            buffers = [k for k in range(len(self.buffers)) if self.buffers[k]["inspector"] == inspector["id"] and self.buffers[k]["component"] == c]
+            rank = dict((priority[k], k) for k in range(len(priority)))
+            order.append(sorted(buffers, key = lambda k: rank.get(self.buffers[k]["workstation"], len(priority))))
+        return order
+
+    #returns the name of the stream of inspection times of the given inspector and component, e.g. I1C1
+    @staticmethod
+    def inspectionStreamName(inspector_id, component_id):
+        return "I" + str(inspector_id) + "C" + str(component_id)
+
+    #returns the name of the stream of assembly times of the given workstation, e.g. W1
+    @staticmethod
+    def assemblyStreamName(workstation_id):
+        return "W" + str(workstation_id)
+
+    #returns the name of the stream used by an inspector to choose its next component, e.g. C2orC3
+    @staticmethod
+    def choiceStreamName(inspector):
+        return "or".join("C" + str(c) for c in inspector["components"])
+
+    #returns the names of every random number stream, in the order of their substreams
+    #the inspection streams come first, then the assembly streams, then the component choice streams
+    def streamNames(self):
+        names = []
+        for i in self.inspectors:
+            for c in i["components"]:
+                names.append(Topology.inspectionStreamName(i["id"], c))
+        for w in self.workstations:
+            names.append(Topology.assemblyStreamName(w["id"]))
+        for i in self.inspectors:
+            if len(i["components"]) > 1:
+                names.append(Topology.choiceStreamName(i))
+        return names
+
+    #returns the data file of every inspection and assembly time stream, keyed by stream name
+    def dataFiles(self):
+        files = {}
+        for i in self.inspectors:
+            for k in range(len(i["components"])):
+                files[Topology.inspectionStreamName(i["id"], i["components"][k])] = i["data"][k]
+        for w in self.workstations:
+            files[Topology.assemblyStreamName(w["id"])] = w["data"]
+        return files
+
+    #returns the topology as a dictionary with the same structure as the json files in the config folder
+    def toDict(self):
+        inspectors = []
+        for i in self.inspectors:
+            inspector = {"id": i["id"],
+                         "components": dict((str(i["components"][k]), i["data"][k]) for k in range(len(i["components"]))),
+                         "weights": dict((str(i["components"][k]), i["weights"][k]) for k in range(len(i["components"]))),
+                         "routing": i["routing"]}
+            if i["priority"] != None:
+                inspector["priority"] = list(i["priority"])
+            inspectors.append(inspector)
+        return {"components": list(self.components),
+                "inspectors": inspectors,
+                "workstations": [dict(w) for w in self.workstations],
+                "buffers": [dict(b) for b in self.buffers]}
@@ -0,0 +1,263 @@
+import argparse
+import time
+import numpy as np
+
+from sim import Config, Simulation, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+from routing import ROUND_ROBIN, SHORTEST_QUEUE, PRIORITY, IDLE_FIRST
+from inputs import INPUT_EXPONENTIAL
+from replicate import ReplicationSummary
+
+#defines a simulation of many replications of the plant at once, with the state of every replication held in NumPy arrays
+#each step executes the next inspection or assembly finish of every replication together, followed by everything that happens
+#at the same time (buffer fills, assembly starts, unblocking), so the Python overhead of a step is shared by all replications
+#the inspection and assembly times must be exponential; each replication is an independent sample path of the same plant as
+#sim.py, drawn from one NumPy generator, so its metrics are statistically equivalent to those of sim.py but not identical
+class LockstepSimulation():
+    #creates n replications of the plant of the config
+    def __init__(self, config, n, seed = 0):
+        if config.inputMode != INPUT_EXPONENTIAL:
+            raise ValueError("the lockstep engine needs exponential inspection and assembly times")
+        topology = config.topology
+        self.topology = topology
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.inspectors = topology.inspectors
+        self.workstations = topology.workstations
+        self.buffers = topology.buffers
+        self.components = topology.components
+        for i in self.inspectors:
+            if i["routing"] not in [ROUND_ROBIN, SHORTEST_QUEUE, PRIORITY, IDLE_FIRST]:
+                raise ValueError("the lockstep engine does not support the routing rule " + str(i["routing"]))
+        inspector_index = dict((self.inspectors[k]["id"], k) for k in range(len(self.inspectors)))
+        workstation_index = dict((self.workstations[k]["id"], k) for k in range(len(self.workstations)))
+        component_index = dict((self.components[k], k) for k in range(len(self.components)))
+        #the inspector, workstation, component index within its inspector, and component of each buffer
+        self.bufferInspector = [inspector_index[b["inspector"]] for b in self.buffers]
+        self.bufferWorkstation = [workstation_index[b["workstation"]] for b in self.buffers]
+        self.bufferComponent = [self.inspectors[self.bufferInspector[k]]["components"].index(self.buffers[k]["component"]) for k in range(len(self.buffers))]
+        self.bufferComponentIndex = [component_index[b["component"]] for b in self.buffers]
+        self.capacity = np.array([b["capacity"] for b in self.buffers])
+        self.workstationBuffers = [[k for k in range(len(self.buffers)) if self.bufferWorkstation[k] == w] for w in range(len(self.workstations))]
+        self.inspectorBuffers = [[np.array(order, dtype = int) for order in topology.routingOrder(i)] for i in self.inspectors]
+        #the component index of each component of each inspector
+        self.inspectorComponents = [[component_index[c] for c in i["components"]] for i in self.inspectors]
+        #the cumulative component weights of each inspector, used to choose its next component
+        self.cumulativeWeights = []
+        for i in self.inspectors:
+            cumulative = np.cumsum(i["weights"])
+            cumulative[-1] = 1.0
+            self.cumulativeWeights.append(cumulative)
+        self.inspectionRates = [np.array([config.lambdas[Topology.inspectionStreamName(i["id"], c)] for c in i["components"]]) for i in self.inspectors]
+        self.assemblyRates = [config.lambdas[Topology.assemblyStreamName(w["id"])] for w in self.workstations]
+        self.reset()
+
+    #puts every replication in the initial state of sim.py: an empty system at time 0 with every inspector starting an inspection
+    def reset(self):
+        n = self.n
+        I = len(self.inspectors)
+        W = len(self.workstations)
+        B = len(self.buffers)
+        C = len(self.components)
+        #the state of every replication
+        self.now = np.zeros(n)
+        self.component = np.zeros((n, I), dtype = int)
+        self.blocked = np.zeros((n, I), dtype = bool)
+        self.level = np.zeros((n, B), dtype = int)
+        self.busy = np.zeros((n, W), dtype = bool)
+        self.pointer = np.zeros((n, B), dtype = int)
+        #the time of the next inspection finish of each inspector, then the next assembly finish of each workstation, or inf if none
+        self.clock = np.full((n, I + W), np.inf)
+        #the buffer fills and assembly starts waiting to happen at the current time
+        self.pendingFill = np.zeros((n, B), dtype = bool)
+        self.pendingAssembly = np.zeros((n, W), dtype = bool)
+        #the statistics of every replication; the areas are time integrals of the state
+        self.arrivals = np.zeros((n, C))
+        self.departures = np.zeros((n, C))
+        self.inSystem = np.zeros((n, C))
+        self.inSystemArea = np.zeros((n, C))
+        self.blockedArea = np.zeros((n, I))
+        self.levelArea = np.zeros((n, B))
+        self.busyArea = np.zeros((n, W))
+        self.products = np.zeros((n, W))
+        self.steps = 0
+        rows = np.arange(n)
+        for i in range(I):
+            self.startInspection(rows, i)
+
+    #makes the inspector choose its next component and start inspecting it, in the given replications
+    #a component chosen by an inspector of several components enters the system when it is chosen
+    def startInspection(self, rows, i):
+        if len(rows) == 0:
+            return
+        components = self.inspectorComponents[i]
+        if len(components) > 1:
+            choice = np.searchsorted(self.cumulativeWeights[i], self.rng.random(len(rows)), side = "right")
+            self.component[rows, i] = choice
+            for c in range(len(components)):
+                chosen = rows[choice == c]
+                self.arrivals[chosen, components[c]] += 1
+                self.inSystem[chosen, components[c]] += 1
+        rates = self.inspectionRates[i][self.component[rows, i]]
+        self.clock[rows, i] = self.now[rows] + self.rng.exponential(size = len(rows)) / rates
+
+    #makes the inspector of the given replications, which has just finished an inspection, put its component in a buffer
+    #chosen by its routing rule, or block if all of them are full
+    def finishInspection(self, rows, i):
+        self.clock[rows, i] = np.inf
+        for c in range(len(self.inspectorComponents[i])):
+            r = rows[self.component[rows, i] == c]
+            if len(r) == 0:
+                continue
+            buffers = self.inspectorBuffers[i][c]
+            m = len(buffers)
+            levels = self.level[np.ix_(r, buffers)]
+            free = levels < self.capacity[buffers]
+            has_space = free.any(axis = 1)
+            routing = self.inspectors[i]["routing"]
+            if routing == SHORTEST_QUEUE or routing == IDLE_FIRST:
+                #the first buffer holding the fewest components
+                chosen = np.argmin(np.where(free, levels, np.iinfo(levels.dtype).max), axis = 1)
+                if routing == IDLE_FIRST:
+                    #the first free buffer whose workstation is idle takes precedence
+                    idle = free & ~self.busy[np.ix_(r, [self.bufferWorkstation[b] for b in buffers])]
+                    has_idle = idle.any(axis = 1)
+                    chosen = np.where(has_idle, np.argmax(idle, axis = 1), chosen)
+            elif routing == PRIORITY:
+                #the first free buffer in routing order
+                chosen = np.argmax(free, axis = 1)
+            else:
+                #the first free buffer from the round-robin pointer on, after which the pointer moves past it
+                start = self.pointer[r, buffers[0]]
+                order = (start[:, None] + np.arange(m)) % m
+                first = np.argmax(np.take_along_axis(free, order, axis = 1), axis = 1)
+                chosen = order[np.arange(len(r)), first]
+                self.pointer[r[has_space], buffers[0]] = (chosen[has_space] + 1) % m
+            self.pendingFill[r[has_space], buffers[chosen[has_space]]] = True
+            self.blocked[r[~has_space], i] = True
+
+    #makes the workstation of the given replications, which has just finished an assembly, start another one or become idle
+    def finishAssembly(self, rows, w):
+        I = len(self.inspectors)
+        self.clock[rows, I + w] = np.inf
+        self.products[rows, w] += 1
+        for b in self.workstationBuffers[w]:
+            self.departures[rows, self.bufferComponentIndex[b]] += 1
+            self.inSystem[rows, self.bufferComponentIndex[b]] -= 1
+        ready = np.all(self.level[np.ix_(rows, self.workstationBuffers[w])] > 0, axis = 1)
+        self.pendingAssembly[rows[ready], w] = True
+        self.busy[rows[~ready], w] = False
+
+    #executes the buffer fills and assembly starts waiting at the current time, and those they cause, until there are none
+    def resolvePending(self):
+        I = len(self.inspectors)
+        while self.pendingFill.any() or self.pendingAssembly.any():
+            for b in range(len(self.buffers)):
+                rows = np.nonzero(self.pendingFill[:, b])[0]
+                if len(rows) == 0:
+                    continue
+                self.pendingFill[rows, b] = False
+                self.level[rows, b] += 1
+                w = self.bufferWorkstation[b]
+                i = self.bufferInspector[b]
+                ready = ~self.busy[rows, w] & np.all(self.level[np.ix_(rows, self.workstationBuffers[w])] > 0, axis = 1)
+                self.pendingAssembly[rows[ready], w] = True
+                #a component of an inspector that only inspects one component type enters the system when it is put in a buffer
+                if len(self.inspectorComponents[i]) == 1:
+                    self.arrivals[rows, self.bufferComponentIndex[b]] += 1
+                    self.inSystem[rows, self.bufferComponentIndex[b]] += 1
+                self.startInspection(rows, i)
+            for w in range(len(self.workstations)):
+                rows = np.nonzero(self.pendingAssembly[:, w])[0]
+                if len(rows) == 0:
+                    continue
+                self.pendingAssembly[rows, w] = False
+                for b in self.workstationBuffers[w]:
+                    self.level[rows, b] -= 1
+                    #an inspector blocked with this component puts it in the buffer immediately
+                    i = self.bufferInspector[b]
+                    unblocked = rows[self.blocked[rows, i] & (self.component[rows, i] == self.bufferComponent[b])]
+                    self.blocked[unblocked, i] = False
+                    self.pendingFill[unblocked, b] = True
+                self.busy[rows, w] = True
+                self.clock[rows, I + w] = self.now[rows] + self.rng.exponential(size = len(rows)) / self.assemblyRates[w]
+
+    #adds the time from the current time of the given replications to the given times to the areas of their statistics
+    def integrate(self, rows, until):
+        dt = (until - self.now[rows])[:, None]
+        self.inSystemArea[rows] += self.inSystem[rows] * dt
+        self.blockedArea[rows] += self.blocked[rows] * dt
+        self.levelArea[rows] += self.level[rows] * dt
+        self.busyArea[rows] += self.busy[rows] * dt
+        self.now[rows] = until
+
+    #runs every replication until the stop time, one event per replication per step
+    def run(self, stop_time):
+        I = len(self.inspectors)
+        W = len(self.workstations)
+        while True:
+            next_event = np.argmin(self.clock, axis = 1)
+            next_time = self.clock[np.arange(self.n), next_event]
+            rows = np.nonzero(next_time <= stop_time)[0]
+            if len(rows) == 0:
+                break
+            self.integrate(rows, next_time[rows])
+            for i in range(I):
+                self.finishInspection(rows[next_event[rows] == i], i)
+            for w in range(W):
+                self.finishAssembly(rows[next_event[rows] == I + w], w)
+            self.resolvePending()
+            self.steps += 1
+        self.integrate(np.arange(self.n), np.full(self.n, float(stop_time)))
+        return self.metrics(stop_time)
+
+    #returns the metrics of every replication, as a list of dictionaries with the same names as SimulationResults.metrics()
+    #the time-weighted statistics are exact integrals of the state, and the average time in system follows from Little's law
+    def metrics(self, stop_time):
+        replications = []
+        for r in range(self.n):
+            m = {}
+            for k in range(len(self.components)):
+                name = "C" + str(self.components[k])
+                m[name + " arrival rate"] = self.arrivals[r, k] / stop_time
+                m[name + " departure rate"] = self.departures[r, k] / stop_time
+                m[name + " average time in system"] = self.inSystemArea[r, k] / self.departures[r, k] if self.departures[r, k] > 0 else float("nan")
+                m[name + " average number in system"] = self.inSystemArea[r, k] / stop_time
+            for w in range(len(self.workstations)):
+                m["P" + str(self.workstations[w]["id"]) + " finished"] = self.products[r, w]
+            m["Throughput"] = np.sum(self.products[r]) / stop_time
+            for i in range(len(self.inspectors)):
+                m["Inspector " + str(self.inspectors[i]["id"]) + " idle %"] = 100 * self.blockedArea[r, i] / stop_time
+            for b in range(len(self.buffers)):
+                m["Buffer " + str(self.buffers[b]["inspector"]) + " " + str(self.buffers[b]["workstation"]) + " occupancy"] = self.levelArea[r, b] / stop_time
+            for w in range(len(self.workstations)):
+                m["Workstation " + str(self.workstations[w]["id"]) + " busy %"] = 100 * self.busyArea[r, w] / stop_time
+            replications.append(dict((name, float(m[name])) for name in m))
+        return replications
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run many replications of the simulation at once with the lockstep NumPy engine")
+    parser.add_argument("-n", "--replications", type = int, default = 1000, help = "number of replications")
+    parser.add_argument("-t", "--stop-time", type = int, default = 10000, help = "minutes to run each replication for")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the NumPy generator")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    parser.add_argument("-c", "--confidence", type = float, default = 0.95, help = "confidence level of the intervals")
+    parser.add_argument("--compare", type = int, default = 0, help = "also run this many replications with sim.py in this process and compare the time per replication")
+    args = parser.parse_args()
+
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology))
+    start = time.perf_counter()
+    replications = LockstepSimulation(config, args.replications, args.seed).run(args.stop_time)
+    lockstep_time = time.perf_counter() - start
+    ReplicationSummary(replications, args.confidence).report()
+    print("LOCKSTEP ENGINE:", args.replications, "replications in", round(lockstep_time, 3), "s |", round(1000 * lockstep_time / args.replications, 3), "ms/replication")
+    if args.compare > 0:
+        start = time.perf_counter()
+        simulated = [Simulation(config, args.seed, r).run(args.stop_time).metrics() for r in range(args.compare)]
+        event_time = time.perf_counter() - start
+        print("EVENT ENGINE:", args.compare, "replications in", round(event_time, 3), "s |", round(1000 * event_time / args.compare, 3), "ms/replication")
+        summary = ReplicationSummary(simulated, args.confidence)
+        lockstep = ReplicationSummary(replications, args.confidence)
+        print("%-36s %16s %16s" % ("Metric", "Lockstep mean", "Event mean"))
+        for name in summary.intervals:
+            print("%-36s %16.6f %16.6f" % (name, lockstep.intervals[name][0], summary.intervals[name][0]))
@@ -0,0 +1,159 @@
+import argparse
+import math
+import numpy as np
+import scipy.stats as stats
+
+from sim import Config, Simulation, DATA_FOLDER
+from topology import Topology, DEFAULT_TOPOLOGY
+
+#the number of observations averaged into each batch by the MSER-5 rule
+MSER_BATCH_SIZE = 5
+
+#the largest lag-1 autocorrelation of the batch means at which they are treated as independent
+MAX_AUTOCORRELATION = 0.2
+
+#returns the number of leading observations to delete according to the MSER rule, and whether the rule found a truncation point
+#observations are averaged in batches, and the truncation minimizes the squared standard error of the mean of the remaining batches
+#the truncation point is only trusted if it falls in the first half of the data, otherwise the run is too short
+def mser(observations, batch_size = MSER_BATCH_SIZE):
+    n = len(observations) // batch_size
+    if n < 4:
+        return (0, False)
+    batches = np.asarray(observations[:n * batch_size], dtype = float).reshape(n, batch_size).mean(axis = 1)
+    #the sums and sums of squares of the batches from d to the end, for every truncation point d
+    sums = np.cumsum(batches[::-1])[::-1]
+    squares = np.cumsum((batches ** 2)[::-1])[::-1]
+    remaining = np.arange(n, 0, -1)
+    sse = squares - sums ** 2 / remaining
+    scores = sse[:n - 1] / remaining[:n - 1] ** 2
+    d = int(np.argmin(scores))
+    return (d * batch_size, d < n // 2)
+
+#defines a set of batch means kept in constant memory
+#when the number of batches reaches twice the target, adjacent batches are merged and the batch size doubles
+class BatchMeans():
+    #creates the batch means with the given target number of batches
+    def __init__(self, batches = 20):
+        self.batches = batches
+        self.batchSize = 1
+        self.means = []
+        self.currentSum = 0
+        self.currentCount = 0
+    #adds an observation, returning True if it completed a batch
+    def add(self, x):
+        self.currentSum += x
+        self.currentCount += 1
+        if self.currentCount < self.batchSize:
+            return False
+        self.means.append(self.currentSum / self.batchSize)
+        self.currentSum = 0
+        self.currentCount = 0
+        if len(self.means) == 2 * self.batches:
+            self.means = [(self.means[k] + self.means[k + 1]) / 2 for k in range(0, len(self.means), 2)]
+            self.batchSize *= 2
+        return True
+    #returns the mean of the batch means and the half-width of its confidence interval
+    def getInterval(self, confidence = 0.95):
+        n = len(self.means)
+        mean = sum(self.means) / n
+        if n < 2:
+            return (mean, float("nan"))
+        variance = sum((x - mean) ** 2 for x in self.means) / (n - 1)
+        return (mean, stats.t.ppf((1 + confidence) / 2, n - 1) * math.sqrt(variance / n))
+    #returns the lag-1 autocorrelation of the batch means, which is close to 0 once the batches are long enough to be independent
+    def getAutocorrelation(self):
+        n = len(self.means)
+        if n < 3:
+            return float("nan")
+        mean = sum(self.means) / n
+        variance = sum((x - mean) ** 2 for x in self.means)
+        if variance == 0:
+            return 0.0
+        return sum((self.means[k] - mean) * (self.means[k + 1] - mean) for k in range(n - 1)) / variance
+
+#holds the results of a run with automatic warm-up deletion and sequential stopping
+class SequentialResults():
+    #creates the results
+    def __init__(self, warmupTime, results, throughput, halfWidth, batchMeans, converged):
+        self.warmupTime = warmupTime
+        self.results = results
+        self.throughput = throughput
+        self.halfWidth = halfWidth
+        self.batchMeans = batchMeans
+        self.converged = converged
+    #prints the warm-up period, the throughput confidence interval, and the statistics collected after the warm-up period
+    def report(self):
+        print("WARM-UP PERIOD:", self.warmupTime, "minutes")
+        print("SIMULATION FINISHED AT TIME", self.results.stopTime)
+        if not self.converged:
+            print("TARGET PRECISION NOT REACHED BEFORE THE MAXIMUM RUN LENGTH")
+        print("BATCHES:", len(self.batchMeans.means), "of", self.batchMeans.batchSize, "observations | lag-1 autocorrelation", self.batchMeans.getAutocorrelation())
+        print("Throughput:", self.throughput, "+/-", self.halfWidth, "products/min")
+        self.results.report()
+
+#returns the number of products completed by all workstations of the simulation so far
+def totalProducts(sim):
+    return sum(w.productsCompleted for w in sim.workstations)
+
+#detects the warm-up period of the simulation with MSER-5 on the throughput of each interval
+#the pilot run is doubled in length until the truncation point falls in its first half
+def detectWarmup(config, seed = 0, replication = 0, interval = None, pilot_time = 10000, max_time = 10 ** 7):
+    if interval == None:
+        interval = config.measureInterval
+    sim = Simulation(config, seed, replication)
+    sim.start()
+    observations = []
+    last_products = 0
+    while True:
+        while sim.now < pilot_time:
+            sim.advance(sim.now + interval)
+            products = totalProducts(sim)
+            observations.append((products - last_products) / interval)
+            last_products = products
+        (d, found) = mser(observations)
+        if found or 2 * pilot_time > max_time:
+            return d * interval
+        pilot_time *= 2
+
+#runs the simulation, deletes the detected warm-up period, and keeps running until the confidence interval of the throughput
+#is narrower than the given fraction of its mean
+#the throughput of short intervals is autocorrelated, so the precision is only checked once the lag-1 autocorrelation of the
+#batch means is at most MAX_AUTOCORRELATION; until then the run goes on and the batch size keeps doubling
+#the run after the warm-up period repeats the pilot run exactly, since it uses the same random number streams
+def runUntilPrecise(config, seed = 0, replication = 0, precision = 0.05, confidence = 0.95, interval = None,
+                    batches = 20, pilot_time = 10000, max_time = 10 ** 7):
+    if interval == None:
+        interval = config.measureInterval
+    warmup_time = detectWarmup(config, seed, replication, interval, pilot_time, max_time)
+    sim = Simulation(config, seed, replication)
+    sim.start()
+    sim.advance(warmup_time)
+    sim.resetStatistics()
+    batch_means = BatchMeans(batches)
+    last_products = 0
+    converged = False
+    while sim.now < max_time:
+        sim.advance(sim.now + interval)
+        products = totalProducts(sim)
+        if batch_means.add((products - last_products) / interval) and len(batch_means.means) >= batches and batch_means.getAutocorrelation() <= MAX_AUTOCORRELATION:
+            (mean, half_width) = batch_means.getInterval(confidence)
+            if mean > 0 and half_width / mean <= precision:
+                converged = True
+                break
+        last_products = products
+    (mean, half_width) = batch_means.getInterval(confidence)
+    return SequentialResults(warmup_time, sim.getResults(), mean, half_width, batch_means, converged)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run the simulation with automatic warm-up deletion until the throughput is known to the given precision")
+    parser.add_argument("-p", "--precision", type = float, default = 0.05, help = "target half-width of the throughput confidence interval, relative to its mean")
+    parser.add_argument("-c", "--confidence", type = float, default = 0.95, help = "confidence level of the interval")
+    parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the random number streams")
+    parser.add_argument("-b", "--batches", type = int, default = 20, help = "number of batch means")
+    parser.add_argument("--max-time", type = int, default = 10 ** 7, help = "longest run in minutes")
+    parser.add_argument("--topology", default = DEFAULT_TOPOLOGY, help = "json file describing the plant")
+    args = parser.parse_args()
+
+    config = Config.fromDataFolder(DATA_FOLDER, Topology.load(args.topology))
+    results = runUntilPrecise(config, args.seed, 0, args.precision, args.confidence, batches = args.batches, max_time = args.max_time)
+    results.report()
@@ -0,0 +1,86 @@
+import json
+import queue
+import threading
+import time
+
+#the number of windows that can wait to be written before the simulation waits for the writer
+QUEUE_SIZE = 1024
+
+#returns the cumulative statistics of the simulation up to its current time, counted from when they were last reset
+#unlike the totals kept by the entities, the areas include the time since the last change, so they are exact at any time
+def cumulativeStatistics(sim):
+    now = sim.now
+    products = dict((w.id, w.productsCompleted) for w in sim.workstations)
+    occupancy = {}
+    for b in sim.buffers:
+        occupancy[str(b.inspector.id) + " " + str(b.workstation.id)] = b.totalCapacityMinutes + b.capacity * (now - b.timeOfLastCapacityChange)
+    blocked = {}
+    for i in sim.inspectors:
+        blocked[i.id] = i.totalWaitTime + (now - i.waitingSinceTime if i.waiting != False else 0)
+    busy = {}
+    for w in sim.workstations:
+        #the busy time of an assembly is counted when it begins, so the part still to come is taken off
+        busy[w.id] = w.totalBusyTime - (w.busyUntil - now if w.busy else 0)
+    return {"products": products, "occupancy": occupancy, "blocked": blocked, "busy": busy}
+
+#defines an exporter of the metrics of each window of simulated time to an append-only JSONL file
+#the simulation hands each window to a bounded queue, and a background thread writes and flushes it, so the file always holds
+#every finished window even if the run is killed, and the simulation never waits for the disk unless the queue is full
+#the first window starts when the exporter is created, so a run resumed from a checkpoint only appends the windows after it
+class WindowExporter():
+    #opens the file and starts the writer thread, taking the current state of the simulation as the start of the first window
+    def __init__(self, sim, filename, interval, queueSize = QUEUE_SIZE):
+        self.filename = filename
+        self.interval = interval
+        self.queue = queue.Queue(queueSize)
+        self.previous = cumulativeStatistics(sim)
+        self.previousTime = sim.now
+        self.statisticsStartTime = sim.statisticsStartTime
+        self.wallStart = time.perf_counter()
+        self.file = open(filename, "a")
+        self.writer = threading.Thread(target = self.write)
+        self.writer.start()
+
+    #writes the windows in the queue to the file until the exporter is closed
+    def write(self):
+        while True:
+            record = self.queue.get()
+            if record == None:
+                break
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    #records the window from the previous call, the creation of the exporter, or when the statistics were last reset if that is
+    #later, to the current time of the simulation
+    def record(self, sim):
+        current = cumulativeStatistics(sim)
+        if sim.statisticsStartTime != self.statisticsStartTime:
+            self.statisticsStartTime = sim.statisticsStartTime
+            self.previousTime = sim.statisticsStartTime
+            self.previous = {"products": dict((k, 0) for k in current["products"]),
+                             "occupancy": dict((k, 0) for k in current["occupancy"]),
+                             "blocked": dict((k, 0) for k in current["blocked"]),
+                             "busy": dict((k, 0) for k in current["busy"])}
+        length = sim.now - self.previousTime
+        if length <= 0:
+            return
+        previous = self.previous
+        products = dict((k, current["products"][k] - previous["products"][k]) for k in current["products"])
+        record = {"start": self.previousTime,
+                  "end": sim.now,
+                  "wallTime": time.perf_counter() - self.wallStart,
+                  "events": sim.eventsExecuted,
+                  "throughput": sum(products.values()) / length,
+                  "productsCompleted": products,
+                  "bufferOccupancy": dict((k, (current["occupancy"][k] - previous["occupancy"][k]) / length) for k in current["occupancy"]),
+                  "inspectorBlocked": dict((k, 100 * (current["blocked"][k] - previous["blocked"][k]) / length) for k in current["blocked"]),
+                  "workstationBusy": dict((k, 100 * (current["busy"][k] - previous["busy"][k]) / length) for k in current["busy"])}
+        self.queue.put(record)
+        self.previous = current
+        self.previousTime = sim.now
+
+    #writes the windows still in the queue, stops the writer thread and closes the file
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        self.file.close()